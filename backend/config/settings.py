@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # полнотекстовый поиск
     'rest_framework',
     'django_filters',  # для фильтрации в API
     'django_celery_beat',
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tasks.metrics.MetricsMiddleware',  # первым: время всего стека, SQL-запросы, /metrics
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,6 +91,47 @@ DATABASES = {
     }
 }
 
+# Соединения с Postgres. Вместо нового соединения на каждый запрос/задачу —
+# пул psycopg внутри процесса; размер зависит от типа процесса (DB_PROCESS)
+DB_PROCESS = os.environ.get('DB_PROCESS', 'web')
+DB_POOL_SIZES = {
+    'web': (2, 10),  # потоки одного воркера gunicorn/uvicorn
+    'worker': (1, 2),  # процесс prefork выполняет одну задачу за раз
+    'beat': (1, 1),
+}
+DB_POOL = os.environ.get('DB_POOL', 'True').lower() == 'true'
+# PgBouncer в режиме transaction: серверные курсоры не переживают границу транзакции
+DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', 'False').lower() == 'true'
+
+DATABASES['default'].update({
+    # проверка соединения перед выдачей из пула (или перед переиспользованием без пула)
+    'CONN_HEALTH_CHECKS': True,
+    # пул несовместим с постоянными соединениями Django — держит их сам
+    'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+    'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
+})
+if DB_POOL:
+    pool_min_size, pool_max_size = DB_POOL_SIZES[DB_PROCESS]
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'name': DB_PROCESS,
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', pool_min_size)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', pool_max_size)),
+            # сколько секунд ждать свободное соединение, прежде чем ответить ошибкой
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+            'max_idle': 300,
+            'max_lifetime': 3600,
+        },
+    }
+
+
+# Async-представления горячих эндпоинтов задач (см. tasks/async_views.py).
+# config/asgi.py включает их сам, под WSGI остаются синхронные
+ASYNC_VIEWS = os.environ.get('DJANGO_ASYNC_VIEWS', 'False').lower() == 'true'
+
+# Генератор первичных ключей Task/Category (см. tasks/ids.py)
+ID_GENERATOR = os.environ.get('ID_GENERATOR', 'tasks.ids.TimeSortableIdGenerator')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -135,6 +178,16 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # JSON на orjson, без него — стандартные классы DRF (см. tasks/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'tasks.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'tasks.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20
 }  # доступ API-запросов, для разработки (Исправлено)
@@ -155,6 +208,53 @@ CELERY_TIMEZONE = TIME_ZONE
 # Расписание для периодических задач (Celery Beat) с будильником
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
+# Расписание сроков задач: sorted set в Redis + диспетчер, который забирает созревшие
+TASK_SCHEDULER_REDIS_URL = os.environ.get('TASK_SCHEDULER_REDIS_URL', CELERY_BROKER_URL)
+TASK_SCHEDULER_KEY = os.environ.get('TASK_SCHEDULER_KEY', 'tasks:due')
+# точность уведомлений в секундах
+TASK_SCHEDULER_INTERVAL = float(os.environ.get('TASK_SCHEDULER_INTERVAL', '5'))
+# таймаут записи расписания из запросов API и на сколько секунд отключать его после ошибки Redis
+TASK_SCHEDULER_TIMEOUT = float(os.environ.get('TASK_SCHEDULER_TIMEOUT', '0.1'))
+TASK_SCHEDULER_BACKOFF = float(os.environ.get('TASK_SCHEDULER_BACKOFF', '30'))
+# как часто check_overdue_tasks подбирает то, что прошло мимо расписания
+OVERDUE_SWEEP_INTERVAL = float(os.environ.get('OVERDUE_SWEEP_INTERVAL', '300'))
+# как часто rescue_overdue_tasks перечитывает весь хвост просроченных ради правок задним числом
+OVERDUE_RESCUE_INTERVAL = float(os.environ.get('OVERDUE_RESCUE_INTERVAL', '3600'))
+# на сколько шардов делить проход по просроченным задачам — по числу процессов воркеров
+OVERDUE_SHARDS = int(os.environ.get('OVERDUE_SHARDS', '4'))
+# на сколько секунд отметка check_overdue_tasks отстаёт от момента прохода — дольше самой долгой транзакции записи
+OVERDUE_WATERMARK_LAG = int(os.environ.get('OVERDUE_WATERMARK_LAG', '60'))
+# DatabaseScheduler при старте сам заносит эти записи в базу
+CELERY_BEAT_SCHEDULE = {
+    'dispatch-due-tasks': {
+        'task': 'tasks.tasks.dispatch_due_tasks',
+        'schedule': TASK_SCHEDULER_INTERVAL,
+    },
+    'check-overdue-tasks': {
+        'task': 'tasks.tasks.check_overdue_tasks',
+        'schedule': OVERDUE_SWEEP_INTERVAL,
+    },
+    'rescue-overdue-tasks': {
+        'task': 'tasks.tasks.rescue_overdue_tasks',
+        'schedule': OVERDUE_RESCUE_INTERVAL,
+    },
+}
+
+# Уведомления в Telegram
+BOT_TOKEN = os.environ.get('BOT_TOKEN', '')
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org')
+NOTIFY_KEY_PREFIX = os.environ.get('NOTIFY_KEY_PREFIX', 'notify')
+# сколько чатов разбираем за один flush
+NOTIFY_BATCH_SIZE = int(os.environ.get('NOTIFY_BATCH_SIZE', '500'))
+# размер пула keep-alive соединений и потоков отправки
+NOTIFY_POOL_SIZE = int(os.environ.get('NOTIFY_POOL_SIZE', '8'))
+# лимиты Telegram: ~30 сообщений в секунду на бота и ~1 в секунду на чат
+NOTIFY_GLOBAL_RATE = float(os.environ.get('NOTIFY_GLOBAL_RATE', '30'))
+NOTIFY_CHAT_RATE = float(os.environ.get('NOTIFY_CHAT_RATE', '1'))
+# через сколько секунд повторяем после сетевой ошибки или 5xx
+NOTIFY_ERROR_DELAY = int(os.environ.get('NOTIFY_ERROR_DELAY', '5'))
+NOTIFY_LOCK_TIMEOUT = int(os.environ.get('NOTIFY_LOCK_TIMEOUT', '120'))
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
@@ -16,11 +16,15 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from django.db import connection
 from django.http import JsonResponse
+from tasks.metrics import metrics_view
 
 
 def health_check(request):
-    return JsonResponse({"status": "healthy"})
+    # статистика пула соединений этого процесса: занятость, ожидания, ошибки
+    pool = connection.pool
+    return JsonResponse({"status": "healthy", "db_pool": pool.get_stats() if pool else None})
 
 
 # глобальные маршруты проекта
@@ -29,4 +33,5 @@ urlpatterns = [
     path('api/', include('tasks.urls')),
     path('health/', health_check),
     path('api/health/', health_check),
+    path('metrics', metrics_view),
 ]
@@ -0,0 +1,18 @@
+# gunicorn подхватывает этот файл сам из рабочего каталога (/app)
+import os
+import shutil
+
+
+def on_starting(server):
+    # метрики прошлого запуска мастера в общий каталог не переносим
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # livesum-метрики (пул соединений) умершего воркера больше не учитываются
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
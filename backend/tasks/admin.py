@@ -1,6 +1,49 @@
+import json
+from functools import cached_property
+
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.db.models import Count, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from django.utils.html import format_html
+
+from . import scheduler
 from .models import Task, Category
 
+# меньше этого COUNT(*) дешевле оценки — считаем точно
+ESTIMATE_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator для больших таблиц: число строк берётся из статистики Postgres
+    (pg_class.reltuples без фильтров, оценка планировщика с фильтрами), а не
+    из COUNT(*) по всей таблице. Небольшие результаты считаются точно.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = self.estimate()
+        if estimate is None or estimate < ESTIMATE_THRESHOLD:
+            return super().count
+        return estimate
+
+    def estimate(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet) or connection.vendor != 'postgresql':
+            return None
+        if not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                               [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            # -1 — таблицу ещё ни разу не анализировали
+            return int(row[0]) if row and row[0] >= 0 else None
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -9,26 +52,56 @@ class CategoryAdmin(admin.ModelAdmin):
     list_filter = ('created_at',)
     readonly_fields = ('id', 'created_at')
 
-    def task_count(self, obj):
-        return obj.tasks.count()
+    def get_queryset(self, request):
+        # число задач считается в том же запросе, что и страница; подзапрос, а не JOIN + GROUP BY,
+        # чтобы COUNT(*) пагинатора его отбрасывал и не ходил в таблицу связей
+        Through = Task.categories.through
+        task_count = Through.objects.filter(category_id=OuterRef('pk')).order_by() \
+            .values('category_id').annotate(count=Count('*')).values('count')
+        return super().get_queryset(request).annotate(task_count=Coalesce(Subquery(task_count), 0))
 
-    task_count.short_description = 'Количество задач'
+    # ссылка заменяет фильтр по категориям в списке задач: тот грузил все категории на каждую страницу
+    @admin.display(description='Количество задач', ordering='task_count')
+    def task_count(self, obj):
+        url = reverse('admin:tasks_task_changelist')
+        return format_html('<a href="{}?categories__id__exact={}">{}</a>', url, obj.pk, obj.task_count)
 
 
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
     list_display = ('title', 'telegram_user_id', 'created_at', 'due_date', 'completed', 'category_list')
-    list_filter = ('completed', 'created_at', 'due_date', 'categories')
+    list_filter = ('completed', 'created_at', 'due_date')
     search_fields = ('title', 'description', 'telegram_user_id')
     readonly_fields = ('id', 'created_at')
-    filter_horizontal = ('categories',)
-    date_hierarchy = 'created_at'
+    # категории ищутся по мере ввода, а не грузятся в форму все сразу
+    autocomplete_fields = ('categories',)
     list_per_page = 25
+    # id растут со временем (tasks/ids.py) — порядок тот же, что по created_at, но по индексу первичного ключа
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    # без второго COUNT(*) по всей таблице для "N из M"
+    show_full_result_count = False
 
+    @admin.display(description='Категории')
     def category_list(self, obj):
         return ", ".join([cat.name for cat in obj.categories.all()])
 
-    category_list.short_description = 'Категории'
-
     def get_queryset(self, request):
-        return super().get_queryset(request).prefetch_related('categories')
\ No newline at end of file
+        return super().get_queryset(request).prefetch_related('categories').defer('search_vector')
+
+    # расписание сроков (tasks/scheduler.py) правки из админки тоже должны двигать;
+    # админка пишет внутри транзакции, поэтому Redis трогаем только после коммита
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change or {'due_date', 'completed'} & set(form.changed_data):
+            transaction.on_commit(lambda: scheduler.sync_task(obj))
+
+    def delete_model(self, request, obj):
+        task_id = obj.pk
+        super().delete_model(request, obj)
+        transaction.on_commit(lambda: scheduler.unschedule(task_id))
+
+    def delete_queryset(self, request, queryset):
+        task_ids = list(queryset.values_list('pk', flat=True))
+        super().delete_queryset(request, queryset)
+        transaction.on_commit(lambda: scheduler.unschedule_many(task_ids))
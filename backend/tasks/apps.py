@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class TasksConfig(AppConfig):
     name = 'tasks'
+
+    def ready(self):
+        from .metrics import install_query_observer
+        # счётчик SQL для метрик ставится на каждое соединение, в каком бы потоке оно ни открылось
+        connection_created.connect(install_query_observer, dispatch_uid='tasks.metrics.query_observer')
@@ -0,0 +1,68 @@
+"""
+Async-обработка горячих действий ViewSet под ASGI.
+
+DRF 3.15 не умеет async-представления, а синхронное представление под ASGI
+держит поток на всё время ожидания Postgres. Поэтому для действий из
+async_actions ViewSet отдаёт async-представление, которое вызывает метод
+a<action> (alist, aretrieve, ...) на async ORM. Всё, что async-путь не
+покрывает (другие методы, параметры, Basic-авторизация), уходит в обычный
+синхронный ViewSet — ответы у обоих путей одинаковые.
+
+Включается настройкой ASYNC_VIEWS (config/asgi.py выставляет её сам);
+под WSGI представления остаются синхронными.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+
+
+class AsyncActionsMixin:
+    # действия, у которых есть async-версия a<action>
+    async_actions = ()
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if not settings.ASYNC_VIEWS or not set(actions.values()) & set(cls.async_actions):
+            return view
+        sync_view = sync_to_async(view)
+
+        async def async_view(request, *args, **kwargs):
+            action = actions.get(request.method.lower())
+            if action in cls.async_actions:
+                self = cls(**initkwargs)
+                self.action_map = actions
+                if self.async_supported(request, action):
+                    return await self.adispatch(getattr(self, f'a{action}'), request, *args, **kwargs)
+            return await sync_view(request, *args, **kwargs)
+
+        async_view.cls = cls
+        async_view.initkwargs = initkwargs
+        async_view.actions = actions
+        return csrf_exempt(async_view)
+
+    def async_supported(self, request, action):
+        """Может ли запрос пойти по async-пути"""
+        # BasicAuthentication проверяет пароль синхронным запросом в базу
+        return 'HTTP_AUTHORIZATION' not in request.META
+
+    async def adispatch(self, handler, request, *args, **kwargs):
+        """APIView.dispatch, где обработчик — корутина"""
+        # пользователя из сессии достаём заранее: SessionAuthentication читает его синхронно
+        if hasattr(request, 'auser'):
+            request.user = await request.auser()
+
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            self.initial(request, *args, **kwargs)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
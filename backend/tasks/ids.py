@@ -0,0 +1,114 @@
+"""
+Генераторы первичных ключей для Task и Category.
+
+Ограничения проекта: не UUID, не random, не последовательности БД. Поэтому
+уникальность держится на времени, счётчике и отпечатке процесса (хэш от
+хоста, pid и момента старта). Генератор выбирается настройкой ID_GENERATOR.
+"""
+import hashlib
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyz'  # по возрастанию ASCII — строки сортируются как числа
+
+
+def encode(value, width):
+    """Число в base36 фиксированной ширины"""
+    chars = []
+    for _ in range(width):
+        value, rest = divmod(value, 36)
+        chars.append(ALPHABET[rest])
+    if value:
+        raise ValueError(f"Значение не помещается в {width} знаков base36")
+    return ''.join(reversed(chars))
+
+
+class TimeSortableIdGenerator:
+    """
+    id = миллисекунды (9 знаков) + счётчик внутри миллисекунды + отпечаток процесса.
+    Новые ключи всегда больше старых, поэтому вставки идут в правый край B-дерева
+    первичного ключа, а не в случайную страницу.
+    В пределах процесса id строго возрастают: если счётчик миллисекунды кончился
+    или часы пошли назад, занимаем следующую миллисекунду.
+    """
+    time_width = 9
+    # сдвиг времени: первый символ всегда 'g'..'z', то есть новые id больше
+    # всех прежних hex-id (0-9a-f) и не вклиниваются в середину индекса
+    time_offset = 16 * 36 ** 8
+
+    def __init__(self, length, clock=time.time_ns):
+        self.length = length
+        self.clock = clock
+        rest = length - self.time_width
+        # остаток делим между счётчиком и отпечатком процесса примерно поровну
+        self.counter_width = rest // 2
+        self.node_width = rest - self.counter_width
+        self.counter_limit = 36 ** self.counter_width
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _reset(self):
+        # после fork (gunicorn, celery prefork) у дочернего процесса свой отпечаток
+        self._pid = os.getpid()
+        raw = f"{socket.gethostname()}_{self._pid}_{time.time_ns()}_{time.perf_counter_ns()}"
+        digest = int(hashlib.sha256(raw.encode()).hexdigest(), 16)
+        self.node = encode(digest % 36 ** self.node_width, self.node_width)
+        self.last_ms = -1
+        self.counter = 0
+        self.prefix = ''
+
+    def next_id(self):
+        return self.allocate(1)[0]
+
+    def allocate(self, count):
+        """Выдать сразу count возрастающих id (для bulk_create)"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            now_ms = self.clock() // 1_000_000
+            if now_ms > self.last_ms:
+                self.start_ms(now_ms)
+
+            ids = []
+            for _ in range(count):
+                if self.counter == self.counter_limit:
+                    self.start_ms(self.last_ms + 1)
+                ids.append(self.prefix + encode(self.counter, self.counter_width) + self.node)
+                self.counter += 1
+            return ids
+
+    def start_ms(self, ms):
+        self.last_ms = ms
+        self.counter = 0
+        self.prefix = encode(ms + self.time_offset, self.time_width)
+
+
+class HashIdGenerator:
+    """Прежняя схема: обрезанный SHA-256 от времени. Ключи случайны по всему пространству"""
+
+    def __init__(self, length):
+        self.length = length
+
+    def next_id(self):
+        raw = f"{self.length}_{time.time_ns()}_{time.perf_counter_ns()}"
+        return hashlib.sha256(raw.encode()).hexdigest()[:self.length]
+
+    def allocate(self, count):
+        return [self.next_id() for _ in range(count)]
+
+
+_generators = {}
+
+
+def get_generator(length):
+    """Генератор из настроек, один на длину ключа"""
+    generator = _generators.get(length)
+    if generator is None:
+        generator = import_string(settings.ID_GENERATOR)(length)
+        _generators[length] = generator
+    return generator
@@ -0,0 +1,235 @@
+import random
+import statistics
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+import redis
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import NoReverseMatch, reverse
+from django.utils import timezone
+
+from tasks import scheduler
+from tasks.models import Category, Task
+
+# словарь для заголовков: поиску нужны повторяющиеся слова в разных формах
+WORDS = [
+    'купить', 'молоко', 'хлеб', 'позвонить', 'маме', 'врачу', 'отчёт', 'квартальный', 'встреча',
+    'с', 'командой', 'оплатить', 'счёт', 'за', 'интернет', 'написать', 'письмо', 'клиенту',
+    'проект', 'сдать', 'документы', 'забрать', 'посылку', 'починить', 'кран', 'записаться',
+    'к', 'стоматологу', 'подготовить', 'презентацию', 'обновить', 'резюме', 'тренировка',
+]
+SEARCH_TERMS = ['купить', 'отчёт', 'встреча', 'письм', 'проект', 'оплатить счёт', 'врач']
+SCENARIOS = ['list', 'search', 'category', 'overdue', 'create', 'update', 'toggle']
+SEED_BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = ("Нагрузочный прогон API задач на синтетических данных: по каждому сценарию — "
+            "пропускная способность, p50/p95/p99 и число SQL-запросов на запрос. "
+            "Данные заводятся в отдельной базе test_<NAME>, рабочая база не трогается; "
+            "расписание сроков и очередь уведомлений — под временным префиксом в Redis. "
+            "Нужен PostgreSQL: миграции используют полнотекстовый поиск.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='N пользователей')
+        parser.add_argument('--tasks-per-user', type=int, default=200, help='M задач на пользователя')
+        parser.add_argument('--categories', type=int, default=20, help='K категорий')
+        parser.add_argument('--concurrency', type=int, default=8, help='одновременных клиентов')
+        parser.add_argument('--requests', type=int, default=500, help='запросов на сценарий')
+        parser.add_argument('--scenario', choices=SCENARIOS, action='append',
+                            help='какие сценарии гонять (по умолчанию все доступные)')
+        parser.add_argument('--seed', type=int, default=1, help='seed генератора данных и запросов')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='не удалять базу после прогона и не заполнять её заново')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Нужен PostgreSQL')
+
+        setup_test_environment(debug=False)
+        # созданные задачи попадают в расписание сроков: без своего префикса диспетчер
+        # боевого Celery разослал бы по ним уведомления
+        prefix = f'bench:{uuid.uuid4().hex}'
+        redis_keys = override_settings(TASK_SCHEDULER_KEY=f'{prefix}:due', NOTIFY_KEY_PREFIX=f'{prefix}:notify')
+        redis_keys.enable()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False,
+                                           keepdb=options['keepdb'])
+        try:
+            if Task.objects.exists():
+                self.stdout.write('База уже заполнена, используем как есть')
+            else:
+                started = time.perf_counter()
+                self.seed(options)
+                self.stdout.write(f"Заполнение: {Task.objects.count():,} задач за "
+                                  f"{time.perf_counter() - started:.1f} с")
+
+            data = {
+                'users': list(Task.objects.order_by().values_list('telegram_user_id', flat=True).distinct()),
+                'categories': list(Category.objects.values_list('id', flat=True)),
+                'tasks': list(Task.objects.values_list('id', 'telegram_user_id')),
+            }
+            self.stdout.write(f"{'сценарий':<10}{'запр/с':>9}{'p50 мс':>9}{'p95 мс':>9}{'p99 мс':>9}"
+                              f"{'SQL ср':>8}{'SQL макс':>10}{'ошибок':>8}")
+            for name in options['scenario'] or SCENARIOS:
+                make_request = self.get_scenario(name, data)
+                if make_request is None:
+                    self.stdout.write(f"{name:<10}нет маршрута, пропускаем")
+                    continue
+                self.report(name, self.run_scenario(make_request, options))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            redis_keys.disable()
+            self.clear_redis(prefix)
+            teardown_test_environment()
+
+    def clear_redis(self, prefix):
+        try:
+            client = scheduler.get_client()
+            keys = list(client.scan_iter(f'{prefix}:*'))
+            if keys:
+                client.delete(*keys)
+        except redis.RedisError as exc:
+            self.stderr.write(f'Не удалось убрать ключи {prefix}:* из Redis: {exc}')
+
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+
+        categories = [Category(name=f'Категория {i}') for i in range(options['categories'])]
+        for category in categories:
+            category.save()
+
+        Through = Task.categories.through
+        ids = iter(Task.allocate_ids(options['users'] * options['tasks_per_user']))
+        tasks = []
+        links = []
+        for user in range(1, options['users'] + 1):
+            for _ in range(options['tasks_per_user']):
+                task = Task(id=next(ids), telegram_user_id=user, title=' '.join(rng.sample(WORDS, rng.randint(2, 4))))
+                if rng.random() < 0.3:
+                    task.description = ' '.join(rng.sample(WORDS, rng.randint(3, 8)))
+
+                # треть задач без срока; из остальных ~40% уже в прошлом,
+                # и прошлые чаще выполнены, чем будущие
+                roll = rng.random()
+                if roll < 0.3:
+                    task.completed = rng.random() < 0.3
+                elif roll < 0.58:
+                    task.due_date = now - timedelta(hours=rng.expovariate(1 / 72))
+                    task.completed = rng.random() < 0.6
+                else:
+                    task.due_date = now + timedelta(hours=rng.uniform(1, 24 * 30))
+                    task.completed = rng.random() < 0.1
+
+                tasks.append(task)
+                links.extend(Through(task_id=task.id, category_id=category.id)
+                             for category in rng.sample(categories, min(len(categories), rng.randint(0, 2))))
+
+        Task.objects.bulk_create(tasks, batch_size=SEED_BATCH_SIZE)
+        Through.objects.bulk_create(links, batch_size=SEED_BATCH_SIZE)
+
+    def get_scenario(self, name, data):
+        """Функция rng -> (метод, url, тело) или None, если эндпоинта нет"""
+        users, categories, tasks = data['users'], data['categories'], data['tasks']
+
+        if name == 'list':
+            return lambda rng: ('get', f'/api/tasks/?telegram_user_id={rng.choice(users)}', None)
+        if name == 'search':
+            return lambda rng: ('get', f'/api/tasks/?telegram_user_id={rng.choice(users)}'
+                                       f'&search={rng.choice(SEARCH_TERMS)}', None)
+        if name == 'category':
+            if not categories:
+                return None
+            return lambda rng: ('get', f'/api/tasks/?telegram_user_id={rng.choice(users)}'
+                                       f'&categories={rng.choice(categories)}', None)
+        if name == 'create':
+            return lambda rng: ('post', '/api/tasks/', {
+                'title': ' '.join(rng.sample(WORDS, 3)),
+                'telegram_user_id': rng.choice(users),
+                'due_date': (timezone.now() + timedelta(days=rng.randint(1, 30))).isoformat(),
+            })
+        if name == 'update':
+            return lambda rng: ('patch', f'/api/tasks/{rng.choice(tasks)[0]}/', {'title': ' '.join(rng.sample(WORDS, 3))})
+
+        # эндпоинты, которых может не быть в этой версии API
+        try:
+            if name == 'overdue':
+                url = reverse('task-overdue')
+                return lambda rng: ('get', f'{url}?telegram_user_id={rng.choice(users)}', None)
+            if name == 'toggle':
+                reverse('task-toggle-complete', args=['x'])
+
+                def toggle(rng):
+                    task_id, user = rng.choice(tasks)
+                    return 'post', f"{reverse('task-toggle-complete', args=[task_id])}?telegram_user_id={user}", None
+                return toggle
+        except NoReverseMatch:
+            return None
+        raise CommandError(f'Неизвестный сценарий {name}')
+
+    def run_scenario(self, make_request, options):
+        rng = random.Random(options['seed'])
+        # запросы генерируем заранее: их набор не зависит от числа потоков
+        requests = [make_request(rng) for _ in range(options['requests'])]
+        samples = []
+        errors = []
+        lock = threading.Lock()
+        position = iter(range(len(requests)))
+
+        def worker():
+            client = Client()
+            queries = [0]
+
+            def count(execute, *args):
+                queries[0] += 1
+                return execute(*args)
+
+            try:
+                with connection.execute_wrapper(count):
+                    while True:
+                        with lock:
+                            index = next(position, None)
+                        if index is None:
+                            return
+                        method, url, body = requests[index]
+                        queries[0] = 0
+                        started = time.perf_counter()
+                        response = getattr(client, method)(url, body, content_type='application/json') \
+                            if body is not None else getattr(client, method)(url)
+                        elapsed = time.perf_counter() - started
+                        with lock:
+                            if response.status_code < 400:
+                                samples.append((elapsed, queries[0]))
+                            else:
+                                errors.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['concurrency'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {'samples': samples, 'errors': errors, 'elapsed': time.perf_counter() - started}
+
+    def report(self, name, result):
+        samples = result['samples']
+        if len(samples) < 2:
+            self.stdout.write(f"{name:<10}успешных запросов нет, ошибки: {sorted(set(result['errors']))}")
+            return
+        latencies = [elapsed for elapsed, _ in samples]
+        queries = [count for _, count in samples]
+        percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"{name:<10}{len(samples) / result['elapsed']:>9,.0f}"
+            f"{percentiles[49] * 1000:>9.1f}{percentiles[94] * 1000:>9.1f}{percentiles[98] * 1000:>9.1f}"
+            f"{statistics.mean(queries):>8.1f}{max(queries):>10}{len(result['errors']):>8}"
+        )
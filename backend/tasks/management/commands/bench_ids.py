@@ -0,0 +1,80 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from tasks.ids import HashIdGenerator, TimeSortableIdGenerator
+
+GENERATORS = {
+    'hash': HashIdGenerator,
+    'sortable': TimeSortableIdGenerator,
+}
+
+COLUMNS = ('id', 'title', 'description', 'created_at', 'updated_at', 'completed', 'telegram_user_id')
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает схемы id задач: скорость генерации, скорость вставки и размер индекса PK. "
+            "Каждая схема пишет во временную копию tasks_task со всеми её индексами.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='сколько задач вставлять')
+        parser.add_argument('--existing', type=int, default=0,
+                            help='сколько задач со старыми id лежит в таблице до замера')
+        parser.add_argument('--batch', type=int, default=1000, help='строк в одном INSERT')
+        parser.add_argument('--generator', choices=sorted(GENERATORS), action='append',
+                            help='какие схемы сравнивать (по умолчанию все)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Замер размера индекса есть только для PostgreSQL')
+
+        rows = options['rows']
+        for name in options['generator'] or sorted(GENERATORS):
+            generator = GENERATORS[name](20)
+
+            started = time.perf_counter()
+            generator.allocate(rows)
+            generate_rate = rows / (time.perf_counter() - started)
+
+            table = f'bench_ids_{name}'
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS {table}')
+                cursor.execute(f'CREATE TEMP TABLE {table} (LIKE tasks_task INCLUDING ALL)')
+                try:
+                    if options['existing']:
+                        self.insert(cursor, table, HashIdGenerator(20), options['existing'], options['batch'])
+                    before = self.pk_index_size(cursor, table)
+                    started = time.perf_counter()
+                    self.insert(cursor, table, generator, rows, options['batch'])
+                    insert_rate = rows / (time.perf_counter() - started)
+                    index_growth = self.pk_index_size(cursor, table) - before
+                finally:
+                    cursor.execute(f'DROP TABLE {table}')
+
+            self.stdout.write(
+                f"{name:>9}: генерация {generate_rate:>12,.0f} id/с, "
+                f"вставка {insert_rate:>9,.0f} строк/с, "
+                f"индекс PK +{index_growth / 1024 / 1024:.1f} МБ"
+            )
+
+    def insert(self, cursor, table, generator, rows, batch):
+        now = timezone.now()
+        row_sql = '(' + ', '.join(['%s'] * len(COLUMNS)) + ')'
+        for offset in range(0, rows, batch):
+            ids = generator.allocate(min(batch, rows - offset))
+            params = []
+            for task_id in ids:
+                params.extend((task_id, 'bench', '', now, now, False, 1))
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(COLUMNS)}) VALUES {', '.join([row_sql] * len(ids))}",
+                params
+            )
+
+    def pk_index_size(self, cursor, table):
+        cursor.execute(
+            "SELECT pg_relation_size(indexrelid) FROM pg_index WHERE indrelid = %s::regclass AND indisprimary",
+            [table]
+        )
+        return cursor.fetchone()[0]
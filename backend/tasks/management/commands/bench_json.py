@@ -0,0 +1,77 @@
+import io
+import json
+import random
+import timeit
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.fields import DateTimeField
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from tasks.renderers import FastJSONParser, FastJSONRenderer, orjson
+
+from .bench_api import WORDS
+
+
+class Command(BaseCommand):
+    help = ("Микробенчмарк JSON на страницах списка задач: рендер и разбор в DRF "
+            "(стандартные классы против tasks.renderers) и декодер бота (json против orjson).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, action='append',
+                            help='задач на странице (по умолчанию 20 и 100)')
+        parser.add_argument('--categories', type=int, default=2, help='категорий у задачи')
+        parser.add_argument('--repeat', type=int, default=5, help='повторов, берётся лучший')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write('orjson не установлен — быстрые классы работают как стандартные')
+
+        rng = random.Random(options['seed'])
+        for page_size in options['page_size'] or [20, 100]:
+            page = self.make_page(rng, page_size, options['categories'])
+            body = JSONRenderer().render(page)
+            self.stdout.write(f"\nСтраница из {page_size} задач, {len(body) / 1024:.1f} КБ")
+            self.stdout.write(f"{'':<16}{'json мкс':>10}{'orjson мкс':>12}{'ускорение':>11}")
+
+            self.compare('рендер DRF', options, lambda: JSONRenderer().render(page),
+                         lambda: FastJSONRenderer().render(page))
+            self.compare('разбор DRF', options, lambda: JSONParser().parse(io.BytesIO(body)),
+                         lambda: FastJSONParser().parse(io.BytesIO(body)))
+            self.compare('декодер бота', options, lambda: json.loads(body),
+                         lambda: (orjson or json).loads(body))
+
+    def make_page(self, rng, page_size, categories_per_task):
+        """Страница в форме ответа TaskReadSerializer"""
+        to_datetime = DateTimeField().to_representation
+        now = timezone.now()
+        categories = [
+            {'id': f'{i:016d}', 'name': f'Категория {i}', 'created_at': to_datetime(now - timedelta(days=i))}
+            for i in range(10)
+        ]
+        results = []
+        for i in range(page_size):
+            due_date = now + timedelta(hours=rng.uniform(-72, 720)) if rng.random() < 0.7 else None
+            results.append({
+                'id': f'{i:020d}',
+                'title': ' '.join(rng.sample(WORDS, rng.randint(2, 4))),
+                'description': ' '.join(rng.sample(WORDS, rng.randint(3, 12))) if rng.random() < 0.5 else '',
+                'created_at': to_datetime(now - timedelta(minutes=i)),
+                'due_date': to_datetime(due_date),
+                'completed': rng.random() < 0.3,
+                'telegram_user_id': 123456789,
+                'categories': rng.sample(categories, categories_per_task),
+            })
+        return {'next': 'http://backend:8000/api/tasks/?cursor=cD0yMDI0', 'previous': None, 'results': results}
+
+    def compare(self, label, options, baseline, fast):
+        assert baseline() == fast(), f'{label}: результаты различаются'
+        times = []
+        for func in (baseline, fast):
+            number, _ = timeit.Timer(func).autorange()
+            best = min(timeit.repeat(func, number=number, repeat=options['repeat']))
+            times.append(best / number * 1_000_000)
+        self.stdout.write(f"{label:<16}{times[0]:>10.1f}{times[1]:>12.1f}{times[0] / times[1]:>10.1f}x")
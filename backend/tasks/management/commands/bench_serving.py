@@ -0,0 +1,155 @@
+import asyncio
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.models import Task
+
+SERVERS = {
+    'wsgi': ['config.wsgi:application'],
+    'asgi': ['config.asgi:application', '--worker-class', 'uvicorn.workers.UvicornWorker'],
+}
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает WSGI (gunicorn) и ASGI (gunicorn + uvicorn) на горячих эндпоинтах задач: "
+            "пропускная способность, p50/p99 и память воркеров. Серверы поднимаются на той же базе.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=3, help='воркеров gunicorn для WSGI')
+        parser.add_argument('--asgi-workers', type=int, help='воркеров для ASGI (по умолчанию как --workers)')
+        parser.add_argument('--concurrency', type=int, default=64, help='одновременных запросов')
+        parser.add_argument('--duration', type=float, default=10, help='секунд нагрузки на каждый сервер')
+        parser.add_argument('--tasks', type=int, default=200, help='сколько задач завести тестовому пользователю')
+        parser.add_argument('--user', type=int, default=900000001, help='telegram_user_id тестового пользователя')
+        parser.add_argument('--endpoint', choices=['list', 'retrieve', 'create'], action='append',
+                            help='какие запросы слать (по умолчанию list и retrieve)')
+        parser.add_argument('--port', type=int, default=8100)
+        parser.add_argument('--mode', choices=sorted(SERVERS), action='append',
+                            help='какие серверы сравнивать (по умолчанию оба)')
+
+    def handle(self, *args, **options):
+        if Task.objects.filter(telegram_user_id=options['user']).exists():
+            raise CommandError(f"У пользователя {options['user']} уже есть задачи, выберите другой --user")
+
+        ids = Task.allocate_ids(options['tasks'])
+        Task.objects.bulk_create(
+            [Task(id=task_id, title=f'Задача {i}', telegram_user_id=options['user']) for i, task_id in enumerate(ids)]
+        )
+        try:
+            for mode in options['mode'] or ['wsgi', 'asgi']:
+                workers = options['workers'] if mode == 'wsgi' else options['asgi_workers'] or options['workers']
+                self.run_mode(mode, workers, ids, options)
+        finally:
+            Task.objects.filter(telegram_user_id=options['user']).delete()
+
+    def run_mode(self, mode, workers, ids, options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'config.settings'}
+        # WSGI меряем как есть, без async-представлений
+        env.pop('DJANGO_ASYNC_VIEWS', None)
+        base_url = f"http://127.0.0.1:{options['port']}"
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', *SERVERS[mode], '--bind', f"127.0.0.1:{options['port']}",
+             '--workers', str(workers), '--log-level', 'warning'],
+            cwd=settings.BASE_DIR, env=env
+        )
+        try:
+            asyncio.run(self.wait_ready(base_url))
+            stats = asyncio.run(self.load(base_url, ids, options))
+            memory = process_tree_rss(server.pid)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+
+        latencies = stats['latencies']
+        if len(latencies) < 2:
+            raise CommandError(f"{mode}: сервер не ответил ни на один запрос")
+        percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"{mode}: {workers} воркеров, память {memory / 1024 / 1024:.0f} МБ, "
+            f"{len(latencies) / options['duration']:,.0f} запр/с, "
+            f"p50 {percentiles[49] * 1000:.1f} мс, p99 {percentiles[98] * 1000:.1f} мс, "
+            f"ошибок {stats['errors']}"
+        )
+
+    async def wait_ready(self, base_url, timeout=30):
+        deadline = time.monotonic() + timeout
+        async with aiohttp.ClientSession() as session:
+            while time.monotonic() < deadline:
+                try:
+                    async with session.get(f'{base_url}/api/health/') as response:
+                        if response.status == 200:
+                            return
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.2)
+        raise CommandError('Сервер не поднялся')
+
+    async def load(self, base_url, ids, options):
+        user = options['user']
+        endpoints = options['endpoint'] or ['list', 'retrieve']
+        stats = {'latencies': [], 'errors': 0}
+        deadline = time.monotonic() + options['duration']
+
+        def make_request(endpoint):
+            if endpoint == 'list':
+                return 'GET', f'{base_url}/api/tasks/?telegram_user_id={user}&page_size=20', None
+            if endpoint == 'retrieve':
+                return 'GET', f'{base_url}/api/tasks/{random.choice(ids)}/', None
+            return 'POST', f'{base_url}/api/tasks/', {'title': 'Нагрузка', 'telegram_user_id': user}
+
+        async def client(session):
+            while time.monotonic() < deadline:
+                method, url, body = make_request(random.choice(endpoints))
+                started = time.perf_counter()
+                try:
+                    async with session.request(method, url, json=body) as response:
+                        await response.read()
+                        ok = response.status < 400
+                except aiohttp.ClientError:
+                    ok = False
+                if ok:
+                    stats['latencies'].append(time.perf_counter() - started)
+                else:
+                    stats['errors'] += 1
+
+        connector = aiohttp.TCPConnector(limit=options['concurrency'])
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await asyncio.gather(*(client(session) for _ in range(options['concurrency'])))
+        return stats
+
+
+def process_tree_rss(pid):
+    """RSS процесса и всех его потомков в байтах (Linux, /proc)"""
+    parents = {}
+    for stat in Path('/proc').glob('[0-9]*/stat'):
+        try:
+            fields = stat.read_text().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        parents[int(stat.parent.name)] = int(fields[1])
+
+    tree = {pid}
+    added = True
+    while added:
+        children = {child for child, parent in parents.items() if parent in tree} - tree
+        tree |= children
+        added = bool(children)
+
+    total = 0
+    for member in tree:
+        try:
+            rss_pages = int(Path(f'/proc/{member}/statm').read_text().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        total += rss_pages * os.sysconf('SC_PAGE_SIZE')
+    return total
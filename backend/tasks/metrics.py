@@ -0,0 +1,174 @@
+"""
+Метрики Prometheus: время ответа, размер ответа, число и время SQL-запросов
+по каждому маршруту, время сериализации и состояние пула соединений.
+
+Под gunicorn с несколькими воркерами метрики пишутся в общий каталог
+PROMETHEUS_MULTIPROC_DIR (режим multiprocess prometheus_client), и /metrics
+из любого воркера отдаёт сумму по всем. Хуки для очистки каталога — в
+gunicorn.conf.py. Без переменной работает обычный реестр одного процесса.
+"""
+import os
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Время обработки запроса',
+    ['view', 'method', 'status'],
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes', 'Размер тела ответа',
+    ['view', 'method'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, float('inf')),
+)
+DB_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL-запросов на один HTTP-запрос',
+    ['view', 'method'],
+    buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21, 34, 55, 89, float('inf')),
+)
+DB_TIME = Histogram(
+    'http_request_db_seconds', 'Время в SQL-запросах за один HTTP-запрос',
+    ['view', 'method'],
+)
+SERIALIZER_TIME = Histogram(
+    'serializer_duration_seconds', 'Время построения ответа сериализатором (.data)',
+    ['serializer'],
+)
+# livesum: сумма по живым воркерам
+POOL_GAUGES = {
+    name: Gauge(f'db_pool_{name}', f'Пул соединений с Postgres: {name}', multiprocess_mode='livesum')
+    for name in ('size', 'available', 'requests_waiting')
+}
+# статистику пула обновляем не чаще раза в секунду на процесс
+POOL_STATS_INTERVAL = 1.0
+
+
+# счётчик текущего HTTP-запроса; контекст копируется в поток sync_to_async,
+# поэтому под ASGI его видят и запросы ORM, которые идут не в потоке event loop
+current_observer = ContextVar('current_observer', default=None)
+
+
+class QueryObserver:
+    """Считает SQL-запросы и время в них"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+def observe_queries(execute, sql, params, many, context):
+    """execute_wrapper, постоянно стоящий на каждом соединении: отдаёт запрос счётчику из контекста"""
+    observer = current_observer.get()
+    if observer is None:
+        return execute(sql, params, many, context)
+    return observer(execute, sql, params, many, context)
+
+
+def install_query_observer(sender, connection, **kwargs):
+    """Обработчик connection_created: соединения у Django свои в каждом потоке"""
+    if observe_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe_queries)
+
+
+class MetricsMiddleware:
+    """Ставится первым в MIDDLEWARE, чтобы время включало весь стек.
+    Умеет и sync, и async: под ASGI не переключает цепочку в поток."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pool_updated = 0.0
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        observer = QueryObserver()
+        token = current_observer.set(observer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_observer.reset(token)
+        self.observe(request, response, observer, started)
+        return response
+
+    async def __acall__(self, request):
+        observer = QueryObserver()
+        token = current_observer.set(observer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_observer.reset(token)
+        self.observe(request, response, observer, started)
+        return response
+
+    def observe(self, request, response, observer, started):
+        elapsed = time.perf_counter() - started
+        # имя маршрута, а не путь: у /api/tasks/<id>/ одна серия на все id
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        method = request.method
+        REQUEST_LATENCY.labels(view, method, str(response.status_code)).observe(elapsed)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(view, method).observe(len(response.content))
+        DB_QUERIES.labels(view, method).observe(observer.count)
+        DB_TIME.labels(view, method).observe(observer.duration)
+
+        if started - self.pool_updated > POOL_STATS_INTERVAL:
+            self.pool_updated = started
+            update_pool_gauges()
+
+
+def update_pool_gauges():
+    pool = connection.pool
+    if pool is None:
+        return
+    stats = pool.get_stats()
+    POOL_GAUGES['size'].set(stats.get('pool_size', 0))
+    POOL_GAUGES['available'].set(stats.get('pool_available', 0))
+    POOL_GAUGES['requests_waiting'].set(stats.get('requests_waiting', 0))
+
+
+class TimedSerializerMixin:
+    """Меряет .data сериализатора верхнего уровня; вложенные входят в его время"""
+
+    @property
+    def data(self):
+        started = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            SERIALIZER_TIME.labels(self.metrics_name()).observe(time.perf_counter() - started)
+
+    def metrics_name(self):
+        child = getattr(self, 'child', None)
+        if child is not None:
+            return f'{type(child).__name__}[]'
+        return type(self).__name__
+
+
+def metrics_view(request):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
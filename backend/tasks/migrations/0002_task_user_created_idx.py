@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:25
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY не держит блокировку записи на tasks_task, но не работает в транзакции
+    atomic = False
+
+    dependencies = [
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(fields=['telegram_user_id', '-created_at', '-id'], name='tasks_task_telegra_424b4a_idx'),
+        ),
+    ]
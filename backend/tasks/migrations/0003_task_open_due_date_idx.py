@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:25
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY не держит блокировку записи на tasks_task, но не работает в транзакции
+    atomic = False
+
+    dependencies = [
+        ('tasks', '0002_task_user_created_idx'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(condition=models.Q(('completed', False)), fields=['due_date'], name='task_open_due_date_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:31
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY не работает в транзакции; ADD COLUMN с постоянным
+    # значением по умолчанию таблицу не переписывает
+    atomic = False
+
+    dependencies = [
+        ('tasks', '0003_task_open_due_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(fields=['telegram_user_id', 'updated_at'], name='tasks_task_telegra_245bb5_idx'),
+        ),
+    ]
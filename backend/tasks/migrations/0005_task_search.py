@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:40
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # ВНИМАНИЕ: ADD COLUMN ... GENERATED ALWAYS AS (...) STORED переписывает всю tasks_task
+    # под ACCESS EXCLUSIVE — чтение и запись задач стоят, пока не посчитается tsvector для каждой
+    # строки (порядка секунд на миллион задач). На большой базе выкатывать в окно обслуживания.
+    # GIN-индекс строится уже CONCURRENTLY, вне транзакции, и запись не блокирует
+    atomic = False
+
+    dependencies = [
+        ('tasks', '0004_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('title', config='russian', weight='A'), '||', django.contrib.postgres.search.SearchVector('description', config='russian', weight='B'), django.contrib.postgres.search.SearchConfig('russian')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        AddIndexConcurrently(
+            model_name='task',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='task_search_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_task_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='task',
+            name='categories',
+            field=models.ManyToManyField(blank=True, related_name='tasks', to='tasks.category', verbose_name='Категории'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:03
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY не держит блокировку записи на tasks_task, но не работает в транзакции
+    atomic = False
+
+    dependencies = [
+        ('tasks', '0006_task_categories_related_name'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(condition=models.Q(('completed', False)), fields=['telegram_user_id', 'due_date', 'id'], name='task_user_open_due_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:09
+
+import django.db.models.deletion
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY не держит блокировку записи на tasks_task, но не работает в транзакции
+    atomic = False
+
+    dependencies = [
+        ('tasks', '0007_task_user_open_due_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OverdueNotification',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('due_date', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Уведомление о просрочке',
+                'verbose_name_plural': 'Уведомления о просрочке',
+            },
+        ),
+        migrations.CreateModel(
+            name='OverdueWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.DateTimeField()),
+            ],
+        ),
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(condition=models.Q(('completed', False)), fields=['updated_at'], name='task_open_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='overduenotification',
+            name='task',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tasks.task'),
+        ),
+        migrations.AddConstraint(
+            model_name='overduenotification',
+            constraint=models.UniqueConstraint(fields=('task', 'due_date'), name='overdue_notification_once'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.contrib.postgres.operations import RemoveIndexConcurrently
+from django.db import migrations, models
+
+# по триггеру на событие: transition table бывает только у триггера с одним событием;
+# уровень оператора — bulk_create/bulk_update на тысячу задач пользователя дают одно обновление версии
+BUMP_SQL = """
+CREATE FUNCTION tasks_bump_list_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO tasks_tasklistversion (telegram_user_id, version)
+        SELECT DISTINCT telegram_user_id, 1 FROM new_rows
+        ON CONFLICT (telegram_user_id) DO UPDATE SET version = tasks_tasklistversion.version + 1;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO tasks_tasklistversion (telegram_user_id, version)
+        SELECT DISTINCT telegram_user_id, 1 FROM old_rows
+        ON CONFLICT (telegram_user_id) DO UPDATE SET version = tasks_tasklistversion.version + 1;
+    ELSE
+        INSERT INTO tasks_tasklistversion (telegram_user_id, version)
+        SELECT telegram_user_id, 1 FROM new_rows UNION SELECT telegram_user_id, 1 FROM old_rows
+        ON CONFLICT (telegram_user_id) DO UPDATE SET version = tasks_tasklistversion.version + 1;
+    END IF;
+    RETURN NULL;
+END
+$$;
+CREATE TRIGGER tasks_task_list_version_insert AFTER INSERT ON tasks_task
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION tasks_bump_list_version();
+CREATE TRIGGER tasks_task_list_version_update AFTER UPDATE ON tasks_task
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION tasks_bump_list_version();
+CREATE TRIGGER tasks_task_list_version_delete AFTER DELETE ON tasks_task
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION tasks_bump_list_version();
+"""
+
+DROP_SQL = """
+DROP TRIGGER tasks_task_list_version_insert ON tasks_task;
+DROP TRIGGER tasks_task_list_version_update ON tasks_task;
+DROP TRIGGER tasks_task_list_version_delete ON tasks_task;
+DROP FUNCTION tasks_bump_list_version();
+"""
+
+
+class Migration(migrations.Migration):
+
+    # DROP INDEX CONCURRENTLY не ждёт идущих запросов к tasks_task под блокировкой, но не работает в транзакции
+    atomic = False
+
+    dependencies = [
+        ('tasks', '0008_overdue_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskListVersion',
+            fields=[
+                ('telegram_user_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(BUMP_SQL, DROP_SQL),
+        # версию списка теперь даёт TaskListVersion; индекс по updated_at лишь утяжелял каждую запись
+        RemoveIndexConcurrently(
+            model_name='task',
+            name='tasks_task_telegra_245bb5_idx',
+        ),
+    ]
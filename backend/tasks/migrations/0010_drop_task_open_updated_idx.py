@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:32
+
+from django.contrib.postgres.operations import RemoveIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # DROP INDEX CONCURRENTLY не ждёт идущих запросов к tasks_task под блокировкой, но не работает в транзакции
+    atomic = False
+
+    dependencies = [
+        ('tasks', '0009_task_list_version'),
+    ]
+
+    operations = [
+        RemoveIndexConcurrently(
+            model_name='task',
+            name='task_open_updated_idx',
+        ),
+    ]
@@ -1,19 +1,23 @@
-import hashlib
-import time
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
 
+from .ids import get_generator
+
 
 class Category(models.Model):  # Категория
     id = models.CharField(primary_key=True, max_length=16, editable=False)
     name = models.CharField(max_length=100, unique=True, verbose_name="Название категории")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    # для ETag списков: меняется при каждом сохранении
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
 
     def save(self, *args, **kwargs):
         if not self.id:
-            raw_id = f"category_{self.name}_{time.time_ns()}_{time.perf_counter_ns()}"
-            self.id = hashlib.sha256(raw_id.encode()).hexdigest()[:16]
-            # хэш-функция вместо random(перевод цифр в буквы)
-            # Итог: Строка, не число, не UUID
+            # генератор из tasks/ids.py: время + счётчик + отпечаток процесса, не UUID и не random
+            self.id = get_generator(16).next_id()
+            # id новый — сразу INSERT без пробного UPDATE; совпадение даст ошибку, а не перезапись
+            kwargs.setdefault('force_insert', True)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -33,15 +37,31 @@ class Task(models.Model):  # название задачи и ее свойст
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     due_date = models.DateTimeField(null=True, blank=True, verbose_name="Дата выполнения")
     completed = models.BooleanField(default=False, verbose_name="Выполнена")
+    # для ETag списков: при обновлении через QuerySet.update() выставлять вручную
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
+    # полнотекстовый поиск: считает сама база при каждой записи, заголовок весомее описания
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('title', weight='A', config='russian')
+            + SearchVector('description', weight='B', config='russian')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
     telegram_user_id = models.BigIntegerField(db_index=True, verbose_name="ID пользователя Telegram")
-    categories = models.ManyToManyField(Category, blank=True, verbose_name="Категории")
+    categories = models.ManyToManyField(Category, blank=True, related_name='tasks', verbose_name="Категории")
 
     def save(self, *args, **kwargs):
         if not self.id:
-            raw_id = f"task_{self.telegram_user_id}_{time.time_ns()}_{self.title}_{time.perf_counter_ns()}"
-            self.id = hashlib.sha256(raw_id.encode()).hexdigest()[:20]
+            self.id = get_generator(20).next_id()
+            kwargs.setdefault('force_insert', True)
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def allocate_ids(count):
+        # пачкой для bulk_create — тот же генератор, что и в save()
+        return get_generator(20).allocate(count)
+
     def __str__(self):
         status = "✓" if self.completed else "✗"
         return f"{status} {self.title}"
@@ -54,4 +74,55 @@ class Task(models.Model):  # название задачи и ее свойст
         indexes = [
             models.Index(fields=['telegram_user_id', 'completed']),
             models.Index(fields=['due_date', 'completed']),
-        ]
\ No newline at end of file
+            # под курсорную пагинацию списка задач пользователя
+            models.Index(fields=['telegram_user_id', '-created_at', '-id']),
+            # только незавершённые задачи — под поиск просроченных
+            models.Index(
+                fields=['due_date'],
+                condition=models.Q(completed=False),
+                name='task_open_due_date_idx',
+            ),
+            # просроченные задачи пользователя: фильтр, сортировка и курсор (due_date, id) — по одному индексу
+            models.Index(
+                fields=['telegram_user_id', 'due_date', 'id'],
+                condition=models.Q(completed=False),
+                name='task_user_open_due_idx',
+            ),
+            # полнотекстовый поиск; пользователь отсекается индексом (telegram_user_id, completed) через BitmapAnd
+            GinIndex(fields=['search_vector'], name='task_search_idx'),
+        ]
+
+
+class TaskListVersion(models.Model):
+    """
+    Версия списка задач пользователя для ETag: триггер в базе (миграция 0009) увеличивает её
+    на любую вставку, изменение и удаление задач пользователя — из API, админки и сырого SQL.
+    Проверка списка — чтение одной строки по ключу, а не COUNT по всем задачам пользователя.
+    """
+    telegram_user_id = models.BigIntegerField(primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+
+class OverdueNotification(models.Model):
+    """
+    Журнал уведомлений о просрочке: одна строка на (задача, срок). Повторный проход
+    по тем же задачам ничего не шлёт, а перенос срока — новый ключ, и задача снова ждёт уведомления.
+    """
+    id = models.BigAutoField(primary_key=True)
+    # отдельный индекс не нужен: task_id — первая колонка уникального ограничения
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='+', db_index=False)
+    due_date = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Уведомление о просрочке"
+        verbose_name_plural = "Уведомления о просрочке"
+        constraints = [
+            # по нему INSERT ... ON CONFLICT DO NOTHING и каскадное удаление по task_id
+            models.UniqueConstraint(fields=['task', 'due_date'], name='overdue_notification_once'),
+        ]
+
+
+class OverdueWatermark(models.Model):
+    """До какого момента check_overdue_tasks уже просмотрела сроки"""
+    name = models.CharField(primary_key=True, max_length=50)
+    value = models.DateTimeField()
@@ -0,0 +1,335 @@
+"""
+Доставка уведомлений в Telegram.
+
+Уведомления не шлются по одному: они копятся в Redis (hash на чат, поэтому
+несколько просроченных задач одного пользователя склеиваются в одно
+сообщение), а flush_notifications разбирает их пачками и отправляет через
+общий keep-alive пул соединений, соблюдая лимиты Telegram токен-бакетами.
+Бакеты лежат в Redis, а не в памяти процесса: лимиты общие для всех
+процессов воркера (prefork) и переживают перезапуск.
+На 429 чат откладывается на retry_after, а сам flush перепланируется через
+countdown — воркер при этом не спит.
+"""
+import html
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .scheduler import get_client
+
+logger = logging.getLogger(__name__)
+
+# лимит длины сообщения Telegram
+MESSAGE_LIMIT = 4096
+# 401/404 от Bot API — неверный BOT_TOKEN или TELEGRAM_API_URL; не чаще раза в минуту
+CONFIG_ERROR_DELAY = 60
+
+SENT = 'sent'
+RETRY = 'retry'
+FLOOD = 'flood'
+CONFIG = 'config'
+DROP = 'drop'
+
+# забираем созревшие чаты вместе с их задачами: hash чата переезжает в processing
+# с дедлайном и удаляется только после отправки (complete) или возврата в очередь (requeue).
+# Сначала возвращаем в очередь то, что зависло в processing дольше дедлайна — воркер упал
+# или flush не уложился в NOTIFY_LOCK_TIMEOUT; свежие задачи из pending при этом не затираются
+CLAIM_SCRIPT = """
+local stale = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, chat in ipairs(stale) do
+    local src = ARGV[4] .. chat
+    local items = redis.call('HGETALL', src)
+    for i = 1, #items, 2 do
+        redis.call('HSETNX', ARGV[3] .. chat, items[i], items[i + 1])
+    end
+    redis.call('DEL', src)
+    redis.call('ZREM', KEYS[2], chat)
+    redis.call('ZADD', KEYS[1], 'NX', ARGV[1], chat)
+end
+
+local chats = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+local result = {}
+for _, chat in ipairs(chats) do
+    local key = ARGV[3] .. chat
+    local processing = ARGV[4] .. chat
+    if redis.call('EXISTS', processing) == 1 then
+        -- чат ещё отправляет прошлый flush — вернёмся к нему после его дедлайна
+        redis.call('ZADD', KEYS[1], ARGV[5], chat)
+    else
+        result[#result + 1] = chat
+        result[#result + 1] = redis.call('HGETALL', key)
+        if redis.call('EXISTS', key) == 1 then
+            redis.call('RENAME', key, processing)
+            redis.call('ZADD', KEYS[2], ARGV[5], chat)
+        end
+        redis.call('ZREM', KEYS[1], chat)
+    end
+end
+return result
+"""
+
+
+# токен-бакет: пополняем по времени, берём токен или говорим, сколько ждать;
+# число возвращается строкой, иначе Redis обрежет дробную часть
+TAKE_TOKEN_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local rate, capacity, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens, updated = tonumber(state[1]), tonumber(state[2])
+if tokens == nil then
+    tokens, updated = capacity, now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+-- полный бакет от отсутствующего не отличается — ключ можно забыть
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class TokenBucket:
+    """Токен-бакет в Redis: rate токенов в секунду, не больше capacity про запас"""
+
+    def __init__(self, key, rate, capacity, clock=time.time):
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+
+    def try_acquire(self):
+        """Взять токен. Возвращает 0, если получилось, иначе сколько секунд ждать"""
+        global _take_token
+        if _take_token is None:
+            _take_token = get_client().register_script(TAKE_TOKEN_SCRIPT)
+        return float(_take_token(keys=[self.key], args=[self.rate, self.capacity, self.clock()]))
+
+
+class TelegramClient:
+    """sendMessage через один requests.Session с пулом keep-alive соединений"""
+
+    def __init__(self, token, base_url, pool_size):
+        self.url = f"{base_url.rstrip('/')}/bot{token}/sendMessage"
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def send_message(self, chat_id, text):
+        """Возвращает (результат, через сколько секунд повторить)"""
+        try:
+            response = self.session.post(
+                self.url,
+                json={'chat_id': chat_id, 'text': text, 'parse_mode': 'HTML'},
+                timeout=(3.05, 10),
+            )
+        except requests.RequestException as e:
+            logger.warning(f"Ошибка отправки уведомления в чат {chat_id}: {e}")
+            return RETRY, settings.NOTIFY_ERROR_DELAY
+
+        if response.status_code == 200:
+            return SENT, 0
+        if response.status_code == 429:
+            try:
+                retry_after = response.json()['parameters']['retry_after']
+            except (ValueError, KeyError, TypeError):
+                retry_after = 1
+            return FLOOD, retry_after
+        if response.status_code >= 500:
+            return RETRY, settings.NOTIFY_ERROR_DELAY
+        if response.status_code in (401, 404):
+            # бот не тот или URL неверный — уведомление не виновато, журнал его уже не повторит
+            logger.error(f"Bot API ответил {response.status_code} — проверьте BOT_TOKEN и TELEGRAM_API_URL")
+            return CONFIG, CONFIG_ERROR_DELAY
+
+        # 400/403: чат не найден, бот заблокирован — повторять бессмысленно
+        logger.warning(f"Telegram отклонил уведомление для {chat_id}: {response.status_code} {response.text}")
+        return DROP, 0
+
+
+_telegram_client = None
+_claim = None
+_take_token = None
+
+
+def get_telegram_client():
+    global _telegram_client
+    key = (settings.BOT_TOKEN, settings.TELEGRAM_API_URL)
+    if _telegram_client is None or _telegram_client[0] != key:
+        client = TelegramClient(settings.BOT_TOKEN, settings.TELEGRAM_API_URL, settings.NOTIFY_POOL_SIZE)
+        _telegram_client = (key, client)
+    return _telegram_client[1]
+
+
+def get_global_bucket():
+    rate = settings.NOTIFY_GLOBAL_RATE
+    return TokenBucket(f'{settings.NOTIFY_KEY_PREFIX}:bucket', rate, rate)
+
+
+def get_chat_bucket(chat_id):
+    return TokenBucket(f'{settings.NOTIFY_KEY_PREFIX}:bucket:{chat_id}', settings.NOTIFY_CHAT_RATE, 1)
+
+
+def chats_key():
+    return f'{settings.NOTIFY_KEY_PREFIX}:chats'
+
+
+def pending_prefix():
+    return f'{settings.NOTIFY_KEY_PREFIX}:pending:'
+
+
+def processing_key():
+    return f'{settings.NOTIFY_KEY_PREFIX}:processing'
+
+
+def processing_prefix():
+    return f'{settings.NOTIFY_KEY_PREFIX}:processing:'
+
+
+def enqueue(notifications):
+    """Положить уведомления (chat_id, task_id, title) в очередь; повтор по task_id склеивается"""
+    now = time.time()
+    pipe = get_client().pipeline()
+    for chat_id, task_id, title in notifications:
+        pipe.hset(f'{pending_prefix()}{chat_id}', task_id, title)
+        # nx: не сбиваем отсрочку чату, который ждёт retry_after
+        pipe.zadd(chats_key(), {chat_id: now}, nx=True)
+    pipe.execute()
+
+
+def requeue(chat_id, items, delay):
+    """Вернуть неотправленное в очередь не раньше чем через delay секунд"""
+    pipe = get_client().pipeline()
+    pipe.hset(f'{pending_prefix()}{chat_id}', mapping=items)
+    pipe.zadd(chats_key(), {chat_id: time.time() + delay})
+    pipe.delete(f'{processing_prefix()}{chat_id}')
+    pipe.zrem(processing_key(), chat_id)
+    pipe.execute()
+
+
+def complete(chat_id):
+    """Уведомление отправлено или отброшено — забыть взятое в processing"""
+    pipe = get_client().pipeline()
+    pipe.delete(f'{processing_prefix()}{chat_id}')
+    pipe.zrem(processing_key(), chat_id)
+    pipe.execute()
+
+
+def claim(limit):
+    """
+    Забрать до limit чатов, которым пора отправлять: {chat_id: {task_id: title}}.
+    Взятое лежит в processing до complete/requeue, а после NOTIFY_LOCK_TIMEOUT возвращается в очередь.
+    """
+    global _claim
+    if _claim is None:
+        _claim = get_client().register_script(CLAIM_SCRIPT)
+    now = time.time()
+    flat = _claim(keys=[chats_key(), processing_key()],
+                  args=[now, limit, pending_prefix(), processing_prefix(), now + settings.NOTIFY_LOCK_TIMEOUT])
+    batch = {}
+    for chat_id, pairs in zip(flat[::2], flat[1::2]):
+        if pairs:
+            batch[chat_id] = dict(zip(pairs[::2], pairs[1::2]))
+    return batch
+
+
+def next_delay():
+    """Через сколько секунд созреет ближайший чат или истечёт взятое в processing; None — всё пусто"""
+    client = get_client()
+    heads = client.zrange(chats_key(), 0, 0, withscores=True) + \
+        client.zrange(processing_key(), 0, 0, withscores=True)
+    if not heads:
+        return None
+    return max(0.0, min(score for _, score in heads) - time.time())
+
+
+def claim_flush_trigger():
+    """True, если за последнюю секунду flush ещё не запускали"""
+    return bool(get_client().set(f'{settings.NOTIFY_KEY_PREFIX}:trigger', 1, nx=True, ex=1))
+
+
+def flush_lock():
+    return get_client().lock(f'{settings.NOTIFY_KEY_PREFIX}:lock', timeout=settings.NOTIFY_LOCK_TIMEOUT)
+
+
+def format_message(titles):
+    if len(titles) == 1:
+        return f"⏰ Задача '{html.escape(titles[0])}' просрочена!"
+
+    lines = [f"⏰ Просрочено задач: {len(titles)}", ""]
+    length = sum(len(line) + 1 for line in lines)
+    for shown, title in enumerate(titles):
+        line = f"• {html.escape(title)}"
+        # оставляем место под хвост "… и ещё N"
+        if length + len(line) + 1 > MESSAGE_LIMIT - 32:
+            lines.append(f"… и ещё {len(titles) - shown}")
+            break
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)
+
+
+def deliver_batch(limit):
+    """
+    Отправить одну пачку. Глобальный лимит выдерживаем короткими паузами,
+    пер-чатовый и 429 — отсрочкой чата в очереди, без сна. После 429 или
+    ошибки настройки бота (401/404) остаток пачки возвращается в очередь.
+    """
+    batch = claim(limit)
+    client = get_telegram_client()
+    global_bucket = get_global_bucket()
+    summary = {'claimed': len(batch), 'sent': 0, 'dropped': 0, 'requeued': 0, 'retry_after': 0}
+    halt = Event()
+
+    def on_done(future):
+        if future.result()[0] in (FLOOD, CONFIG):
+            halt.set()
+
+    futures = {}
+    with ThreadPoolExecutor(max_workers=settings.NOTIFY_POOL_SIZE) as pool:
+        for chat_id, items in batch.items():
+            if halt.is_set():
+                # Telegram просит притормозить или бот настроен неверно — остаток вернём, flush придёт позже
+                requeue(chat_id, items, 0)
+                summary['requeued'] += 1
+                continue
+
+            wait = get_chat_bucket(chat_id).try_acquire()
+            if wait:
+                requeue(chat_id, items, wait)
+                summary['requeued'] += 1
+                continue
+
+            wait = global_bucket.try_acquire()
+            while wait:
+                time.sleep(wait)
+                wait = global_bucket.try_acquire()
+
+            future = pool.submit(client.send_message, chat_id, format_message(list(items.values())))
+            future.add_done_callback(on_done)
+            futures[future] = (chat_id, items)
+
+    for future, (chat_id, items) in futures.items():
+        status, delay = future.result()
+        if status == SENT:
+            complete(chat_id)
+            summary['sent'] += 1
+        elif status == DROP:
+            complete(chat_id)
+            summary['dropped'] += 1
+        else:
+            requeue(chat_id, items, delay)
+            summary['requeued'] += 1
+            if status in (FLOOD, CONFIG):
+                summary['retry_after'] = max(summary['retry_after'], delay)
+
+    return summary
@@ -0,0 +1,194 @@
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Пагинация по ключу (keyset/cursor): вместо OFFSET берём строки "после"
+    последней увиденной записи, поэтому глубокие страницы стоят столько же,
+    сколько первая. COUNT(*) считаем только по запросу ?count=true.
+    """
+    # поля ключа, все в одном направлении; последнее должно быть уникальным
+    ordering = ('-created_at', '-id')
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request)
+        self.count = queryset.count() if self.wants_count(request) else None
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """То же для async-представлений: запросы через async ORM"""
+        page_queryset = self.get_page_queryset(queryset, request)
+        self.count = await queryset.acount() if self.wants_count(request) else None
+        return self.set_page([obj async for obj in page_queryset])
+
+    def get_page_queryset(self, queryset, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.descending = self.ordering[0].startswith('-')
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.model = queryset.model
+
+        self.reverse, self.position = self.decode_cursor(request)
+        # для "назад" идём в обратную сторону и потом разворачиваем страницу
+        forward = not self.reverse
+        queryset = queryset.order_by(*self.get_order_by(forward))
+        if self.position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(self.position, forward))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+
+        if self.reverse:
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+        return self.page
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            payload = {'count': self.count, **payload}
+        return Response(payload)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def wants_count(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true')
+
+    def get_order_by(self, forward):
+        if forward == self.descending:
+            return [f'-{name}' for name in self.fields]
+        return list(self.fields)
+
+    def get_keyset_filter(self, position, forward):
+        # (a, b) < (x, y)  ==  a < x OR (a = x AND b < y)
+        lookup = 'lt' if forward == self.descending else 'gt'
+        condition = Q()
+        for i, name in enumerate(self.fields):
+            step = Q(**{f'{name}__{lookup}': position[i]})
+            for prev_name, prev_value in zip(self.fields[:i], position[:i]):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        # отдельное условие по первому полю, чтобы планировщик взял диапазон по индексу
+        first = Q(**{f'{self.fields[0]}__{lookup}e': position[0]})
+        return first & condition
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(reverse=False, instance=self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(reverse=True, instance=self.page[0])
+
+    def encode_cursor(self, reverse, instance):
+        tokens = {'p': [self.field_to_string(name, instance) for name in self.fields]}
+        if reverse:
+            tokens['r'] = '1'
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return False, None
+
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            raw_position = tokens['p']
+            if len(raw_position) != len(self.fields):
+                raise ValueError
+            position = [
+                self.model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.fields, raw_position)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+        return tokens.get('r', ['0'])[0] == '1', position
+
+    def field_to_string(self, name, instance):
+        value = getattr(instance, name)
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return str(value)
+
+
+class TaskCursorPagination(KeysetPagination):
+    """
+    Курсорная пагинация задач по (created_at, id) внутри telegram_user_id.
+    Старые клиенты с ?page=N или с другой сортировкой (?ordering=...),
+    а также поиск (сортировка по релевантности) получают привычный PageNumberPagination.
+    """
+    ordering = ('-created_at', '-id')
+    default_ordering = '-created_at'
+    fallback_class = PageNumberPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.fallback = None
+        if self.use_fallback(request):
+            self.fallback = self.fallback_class()
+            return self.fallback.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.fallback = None
+        if self.use_fallback(request):
+            self.fallback = self.fallback_class()
+            return await sync_to_async(self.fallback.paginate_queryset)(queryset, request, view)
+        return await super().apaginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def use_fallback(self, request):
+        if self.fallback_class.page_query_param in request.query_params:
+            return True
+        if request.query_params.get(api_settings.SEARCH_PARAM, '').strip():
+            return True
+        ordering = request.query_params.get(api_settings.ORDERING_PARAM)
+        return bool(ordering) and ordering != self.default_ordering
+
+
+class OverduePagination(KeysetPagination):
+    """Просроченные задачи: сначала самые давние, курсор по (due_date, id)"""
+    ordering = ('due_date', 'id')
@@ -0,0 +1,64 @@
+"""
+JSONRenderer и JSONParser на orjson. Ответ байт в байт тот же, что у классов
+DRF: типы, которые orjson понимает по-своему (datetime, Decimal, ленивые
+строки и т. п.), отдаются в JSONEncoder из DRF. Без orjson, с отступами
+(browsable API) и на том, что orjson не умеет (int больше 64 бит), работают
+стандартные классы.
+"""
+import re
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import json
+
+try:
+    import orjson
+except ImportError:  # необязательная зависимость
+    orjson = None
+
+# datetime через DRF: миллисекунды и 'Z' вместо '+00:00', как у стандартного рендерера
+ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+# JSONRenderer экранирует их для вставки в <script>
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+# целые шире 64 бит (от 20 цифр) orjson молча читает как float с потерей точности —
+# такие тела, как и длинные цифры в строках или дробях, разбирает стандартный json
+LONG_NUMBER = re.compile(rb'\d{20}')
+
+
+class FastJSONRenderer(JSONRenderer):
+    def fast_path(self, accepted_media_type, renderer_context):
+        # orjson пишет только компактно и в UTF-8, отступ у него бывает лишь в 2 пробела
+        if orjson is None or self.ensure_ascii or not self.compact:
+            return False
+        return not self.get_indent(accepted_media_type, renderer_context or {})
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not self.fast_path(accepted_media_type, renderer_context) or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80' in ret:
+            for raw, escaped in LINE_SEPARATORS:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            data = stream.read()
+            if LONG_NUMBER.search(data):
+                return json.loads(data, parse_constant=json.strict_constant if self.strict else None)
+            # NaN и Infinity orjson не принимает — как JSONParser при STRICT_JSON
+            return orjson.loads(data)
+        except (ValueError, UnicodeDecodeError) as exc:
+            raise ParseError(f'JSON parse error - {exc}')
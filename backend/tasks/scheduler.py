@@ -0,0 +1,136 @@
+"""
+Расписание сроков задач в Redis sorted set: member — id задачи,
+score — unix-время due_date. Добавление/перенос/отмена стоят O(log n),
+а диспетчер забирает только те записи, чьё время уже пришло.
+
+Ошибки Redis не ломают API: они пишутся в лог, а периодическая
+check_overdue_tasks остаётся страховкой. Запись из запросов идёт с коротким
+таймаутом, а после ошибки расписание TASK_SCHEDULER_BACKOFF секунд не
+трогается вовсе — пока Redis лежит, запись задачи не ждёт его на каждом запросе.
+"""
+import logging
+import time
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# атомарно достаём и удаляем созревшие записи, чтобы два диспетчера не взяли одно и то же
+POP_DUE_SCRIPT = """
+local items = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #items > 0 then
+    redis.call('ZREM', KEYS[1], unpack(items))
+end
+return items
+"""
+
+_client = None
+_request_client = None
+_pop_due = None
+# до какого момента (time.monotonic) Redis считаем недоступным
+_down_until = 0.0
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.TASK_SCHEDULER_REDIS_URL,
+            socket_connect_timeout=1,
+            socket_timeout=1,
+            decode_responses=True,
+        )
+    return _client
+
+
+def get_request_client():
+    """Клиент для записи расписания из запросов API: таймауты в доли секунды"""
+    global _request_client
+    if _request_client is None:
+        _request_client = redis.Redis.from_url(
+            settings.TASK_SCHEDULER_REDIS_URL,
+            socket_connect_timeout=settings.TASK_SCHEDULER_TIMEOUT,
+            socket_timeout=settings.TASK_SCHEDULER_TIMEOUT,
+            decode_responses=True,
+        )
+    return _request_client
+
+
+def available():
+    return time.monotonic() >= _down_until
+
+
+def mark_down(message):
+    """Redis не ответил: не трогаем расписание TASK_SCHEDULER_BACKOFF секунд"""
+    global _down_until
+    _down_until = time.monotonic() + settings.TASK_SCHEDULER_BACKOFF
+    logger.warning(f"{message}. Расписание отключено на {settings.TASK_SCHEDULER_BACKOFF} с, "
+                   f"сроки подберёт check_overdue_tasks")
+
+
+def schedule(task_id, due_date):
+    """Поставить (или перенести) задачу на время due_date"""
+    if not available():
+        return
+    try:
+        get_request_client().zadd(settings.TASK_SCHEDULER_KEY, {task_id: due_date.timestamp()})
+    except redis.RedisError as e:
+        mark_down(f"Не удалось запланировать задачу {task_id}: {e}")
+
+
+def unschedule(task_id):
+    """Убрать задачу из расписания"""
+    if not available():
+        return
+    try:
+        get_request_client().zrem(settings.TASK_SCHEDULER_KEY, task_id)
+    except redis.RedisError as e:
+        mark_down(f"Не удалось снять задачу {task_id} с расписания: {e}")
+
+
+def unschedule_many(task_ids):
+    """Убрать из расписания пачку задач одним ZREM"""
+    if not task_ids or not available():
+        return
+    try:
+        get_request_client().zrem(settings.TASK_SCHEDULER_KEY, *task_ids)
+    except redis.RedisError as e:
+        mark_down(f"Не удалось снять задачи с расписания: {e}")
+
+
+def sync_task(task):
+    """Привести расписание в соответствие с задачей: выполнена или без срока — снимаем"""
+    if task.completed or task.due_date is None:
+        unschedule(task.pk)
+    else:
+        schedule(task.pk, task.due_date)
+
+
+def sync_tasks(tasks):
+    """То же, что sync_task, для пачки задач — одним pipeline"""
+    if not available():
+        return
+    key = settings.TASK_SCHEDULER_KEY
+    try:
+        pipe = get_request_client().pipeline(transaction=False)
+        for task in tasks:
+            if task.completed or task.due_date is None:
+                pipe.zrem(key, task.pk)
+            else:
+                pipe.zadd(key, {task.pk: task.due_date.timestamp()})
+        pipe.execute()
+    except redis.RedisError as e:
+        mark_down(f"Не удалось запланировать пачку задач: {e}")
+
+
+def pop_due(now, limit):
+    """Забрать до limit задач, срок которых наступил к моменту now"""
+    global _pop_due
+    try:
+        if _pop_due is None:
+            _pop_due = get_client().register_script(POP_DUE_SCRIPT)
+        return _pop_due(keys=[settings.TASK_SCHEDULER_KEY], args=[now.timestamp(), limit])
+    except redis.RedisError as e:
+        logger.warning(f"Не удалось прочитать расписание: {e}")
+        return []
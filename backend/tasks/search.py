@@ -0,0 +1,46 @@
+"""
+Полнотекстовый поиск задач по ?search=.
+
+Ищем по хранимому tsvector (конфигурация 'russian': "задачи" находит "задача"),
+последнее слово — по префиксу, чтобы поиск работал по мере набора.
+Результаты упорядочены по релевантности, если клиент не попросил другую
+сортировку через ?ordering=.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+SEARCH_CONFIG = 'russian'
+# слова из букв и цифр: всё остальное (кавычки, &, |, !) в tsquery не пропускаем
+WORD_RE = re.compile(r'\w+')
+
+
+def build_query(text):
+    """'купить молок' -> купить & молок:* ; None, если слов нет"""
+    words = WORD_RE.findall(text.lower())
+    if not words:
+        return None
+    words[-1] += ':*'
+    return SearchQuery(' & '.join(words), config=SEARCH_CONFIG, search_type='raw')
+
+
+class TaskSearchFilter(filters.SearchFilter):
+    """
+    Замена SearchFilter для задач: вместо icontains по каждому полю (seq scan)
+    — GIN-индекс по search_vector. Должен стоять после
+    OrderingFilter, чтобы сортировка по релевантности не перетиралась.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        query = build_query(text)
+        if query is None:
+            return queryset
+
+        queryset = queryset.filter(search_vector=query).annotate(rank=SearchRank(F('search_vector'), query))
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            return queryset
+        return queryset.order_by('-rank', '-created_at', '-id')
@@ -1,15 +1,25 @@
+from asgiref.sync import sync_to_async
+from django.db import transaction
 from rest_framework import serializers
+from . import scheduler
+from .metrics import TimedSerializerMixin
 from .models import Task, Category
 
+
+# списки (many=True) тоже попадают в метрику времени сериализации
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
 # для категорий
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
+        list_serializer_class = TimedListSerializer
         fields = ['id', 'name', 'created_at']
         read_only_fields = ['id', 'created_at']
 
 # для задач
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     categories = CategorySerializer(many=True, read_only=True)
     category_ids = serializers.PrimaryKeyRelatedField(
         many=True,
@@ -27,6 +37,7 @@ class TaskSerializer(serializers.ModelSerializer):
             'categories', 'category_ids'
         ]
         read_only_fields = ['id', 'created_at']
+        list_serializer_class = TimedListSerializer
 
     def validate_telegram_user_id(self, value):
         if value <= 0:
@@ -38,13 +49,107 @@ class TaskSerializer(serializers.ModelSerializer):
         task = Task.objects.create(**validated_data)
         if categories:
             task.categories.set(categories)
+        # расписание пишем после коммита, иначе диспетчер может прочитать старую строку и снять запись
+        transaction.on_commit(lambda: scheduler.sync_task(task))
+        return task
+
+    async def acreate(self, validated_data):
+        """create для async-представлений"""
+        categories = validated_data.pop('categories', [])
+        task = await Task.objects.acreate(**validated_data)
+        if categories:
+            await task.categories.aset(categories)
+        await sync_to_async(scheduler.sync_task)(task)
         return task
 
     def update(self, instance, validated_data):
         categories = validated_data.pop('categories', None)
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-        if categories is not None:
-            instance.categories.set(categories)
-        return instance
\ No newline at end of file
+        # пишем только изменившиеся колонки; PUT с тем же телом не трогает строку вовсе
+        changed = [attr for attr, value in validated_data.items() if getattr(instance, attr) != value]
+        for attr in changed:
+            setattr(instance, attr, validated_data[attr])
+        categories_changed = categories is not None and self.update_categories(instance, categories)
+        if changed or categories_changed:
+            # updated_at — версия задачи для ETag, меняется и при смене одних категорий
+            instance.save(update_fields=[*changed, 'updated_at'])
+        # перепланируем только если поменялось то, от чего зависит срок
+        if 'due_date' in changed or 'completed' in changed:
+            transaction.on_commit(lambda: scheduler.sync_task(instance))
+        return instance
+
+    def update_categories(self, instance, categories):
+        """Разница множеств вместо set(): один DELETE ушедших и один INSERT новых связей"""
+        prefetched = getattr(instance, '_prefetched_objects_cache', {})
+        if 'categories' in prefetched:
+            current = {category.pk for category in prefetched['categories']}
+        else:
+            current = set(instance.categories.values_list('pk', flat=True))
+        wanted = {category.pk for category in categories}
+        if current == wanted:
+            return False
+
+        Through = Task.categories.through
+        if current - wanted:
+            Through.objects.filter(task_id=instance.pk, category_id__in=current - wanted).delete()
+        Through.objects.bulk_create(
+            [Through(task_id=instance.pk, category_id=category_id) for category_id in wanted - current],
+            ignore_conflicts=True
+        )
+        prefetched.pop('categories', None)
+        return True
+
+# поля задачи, доступные в ?fields=; вложенными объектами раскрываются только EXPANDABLE_FIELDS
+TASK_READ_FIELDS = ('id', 'title', 'description', 'created_at', 'due_date', 'completed',
+                    'telegram_user_id', 'categories')
+EXPANDABLE_FIELDS = ('categories',)
+
+
+class TaskReadSerializer(TimedSerializerMixin, serializers.BaseSerializer):
+    """
+    Быстрый сериализатор только для чтения (list, retrieve): словарь собирается
+    напрямую, без полей ModelSerializer на каждый объект. Без fields ответ
+    тот же, что у TaskSerializer. С fields — только эти поля; categories без
+    expand отдаются списком id.
+    """
+    datetime_field = serializers.DateTimeField()
+
+    class Meta:
+        list_serializer_class = TimedListSerializer
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None:
+            fields, expand = TASK_READ_FIELDS, EXPANDABLE_FIELDS
+        # (имя, функция) строятся один раз — при many=True на весь список
+        self.renderers = [(name, self.get_renderer(name, name in expand)) for name in fields]
+
+    def get_renderer(self, name, expand):
+        to_datetime = self.datetime_field.to_representation
+        if name in ('created_at', 'due_date'):
+            return lambda task: to_datetime(getattr(task, name))
+        if name == 'categories':
+            if expand:
+                return lambda task: [
+                    {'id': category.id, 'name': category.name, 'created_at': to_datetime(category.created_at)}
+                    for category in task.categories.all()
+                ]
+            return lambda task: [category.id for category in task.categories.all()]
+        return lambda task: getattr(task, name)
+
+    def to_representation(self, instance):
+        return {name: render(instance) for name, render in self.renderers}
+
+# для bulk-загрузки
+class TaskBulkItemSerializer(TaskSerializer):
+    # категории сверяем с заранее загруженным множеством, а не запросом на каждый id
+    category_ids = serializers.ListField(
+        child=serializers.CharField(max_length=16),
+        write_only=True,
+        required=False
+    )
+
+    def validate_category_ids(self, value):
+        unknown = set(value) - self.context['category_ids']
+        if unknown:
+            raise serializers.ValidationError(f"Категории не найдены: {', '.join(sorted(unknown))}")
+        return list(dict.fromkeys(value))
@@ -0,0 +1,50 @@
+"""
+Счётчики задач пользователя одним запросом: всего, выполнено, в работе,
+просрочено — в целом и по каждой категории.
+
+ORM не умеет GROUPING SETS, поэтому запрос написан на SQL: группа () даёт
+итоги (COUNT DISTINCT — задача с двумя категориями считается один раз),
+группа (category_id) — по категориям, а строка с category_id = NULL в ней —
+задачи без категорий. Пользователь отсекается индексом (telegram_user_id, completed).
+"""
+from django.db import connection
+
+from .models import Category, Task
+
+COUNTERS = ('total', 'completed', 'pending', 'overdue')
+
+
+def stats_sql():
+    through = Task.categories.through._meta
+    task_column = through.get_field('task').column
+    category_column = f"tc.{through.get_field('category').column}"
+    return f"""
+        SELECT {category_column}, MAX(c.name), GROUPING({category_column}),
+               COUNT(DISTINCT t.id),
+               COUNT(DISTINCT t.id) FILTER (WHERE t.completed),
+               COUNT(DISTINCT t.id) FILTER (WHERE NOT t.completed),
+               COUNT(DISTINCT t.id) FILTER (WHERE NOT t.completed AND t.due_date < %s)
+        FROM {Task._meta.db_table} t
+        LEFT JOIN {through.db_table} tc ON tc.{task_column} = t.id
+        LEFT JOIN {Category._meta.db_table} c ON c.id = {category_column}
+        WHERE t.telegram_user_id = %s
+        GROUP BY GROUPING SETS ((), ({category_column}))
+    """
+
+
+def task_stats(user_id, now):
+    result = {**dict.fromkeys(COUNTERS, 0), 'uncategorized': 0, 'categories': []}
+    with connection.cursor() as cursor:
+        cursor.execute(stats_sql(), [now, user_id])
+        rows = cursor.fetchall()
+
+    for category_id, name, is_total, *counts in rows:
+        counters = dict(zip(COUNTERS, counts))
+        if is_total:
+            result.update(counters)
+        elif category_id is None:
+            result['uncategorized'] = counters['total']
+        else:
+            result['categories'].append({'id': category_id, 'name': name, **counters})
+    result['categories'].sort(key=lambda category: category['name'])
+    return result
@@ -1,76 +1,316 @@
-from celery import shared_task
+from datetime import datetime, timedelta
+
+from celery import chord, shared_task
 from django.utils import timezone
 from django.conf import settings
-import requests
-import json
-from .models import Task
+from django.db import connection
+from django.db.models import Q
+from . import notifications, scheduler
+from .models import OverdueNotification, OverdueWatermark, Task
 
 
-@shared_task
-def check_overdue_tasks():
-    now = timezone.now()
-    overdue_tasks = Task.objects.filter(
+# сколько строк тянем одним запросом
+OVERDUE_CHUNK_SIZE = 2000
+# ключ отметки check_overdue_tasks в OverdueWatermark
+OVERDUE_WATERMARK = 'overdue'
+OVERDUE_RESCUE_WATERMARK = 'overdue-rescue'
+
+
+def iter_overdue_tasks(now, after=None, updated_after=None):
+    """
+    Открытые просроченные задачи по возрастанию (due_date, id) пачками по ключу.
+    Каждая пачка — отдельный короткий запрос, а не серверный курсор на весь проход:
+    так работает и за PgBouncer в режиме transaction, и память ограничена пачкой.
+    after — нижняя граница due_date (не включая) для шарда,
+    updated_after — только задачи, изменённые после этого момента (фильтр по строкам, не по индексу).
+    """
+    queryset = Task.objects.filter(
         due_date__lte=now,
-        due_date__isnull=False,
         completed=False
-    ).select_related()
+    ).order_by('due_date', 'id').values_list('id', 'title', 'telegram_user_id', 'due_date')
+    if after is not None:
+        queryset = queryset.filter(due_date__gt=after)
+    if updated_after is not None:
+        queryset = queryset.filter(updated_at__gt=updated_after)
+
+    last = None
+    while True:
+        batch = queryset
+        if last is not None:
+            last_id, last_due_date = last
+            batch = batch.filter(due_date__gte=last_due_date).filter(
+                Q(due_date__gt=last_due_date) | Q(due_date=last_due_date, id__gt=last_id)
+            )
+        rows = list(batch[:OVERDUE_CHUNK_SIZE])
+        yield from rows
+        if len(rows) < OVERDUE_CHUNK_SIZE:
+            return
+        last = (rows[-1][0], rows[-1][3])
+
+
+def overdue_shard_bounds(now, shards, after=None):
+    """
+    Границы шардов по due_date: [(after, until), ...] от after (или с самого начала) до now.
+    Режем по гистограмме due_date из статистики Postgres, чтобы строк в шардах
+    было поровну, а каждый шард читал свой непрерывный кусок индекса.
+    Разрезы берутся только из корзин гистограммы внутри (after, now]: корзина — около
+    1/100 таблицы, поэтому окно check_overdue_tasks между двумя проходами обычно
+    остаётся одним шардом и идёт без chord. Шарды реально работают на первом проходе,
+    после долгого простоя (окно широкое) и в rescue_overdue_tasks по всему хвосту.
+    Без статистики (таблицу не анализировали) — один шард.
+    """
+    if shards > 1 and connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT bound FROM pg_stats, unnest(histogram_bounds::text::timestamptz[]) AS bound "
+                "WHERE schemaname = current_schema() AND tablename = %s AND attname = 'due_date' "
+                "AND bound < %s ORDER BY bound",
+                [Task._meta.db_table, now]
+            )
+            bounds = [row[0] for row in cursor.fetchall() if after is None or row[0] > after]
+    else:
+        bounds = []
+
+    step = len(bounds) / shards
+    cuts = sorted({bounds[int(i * step)] for i in range(1, shards)}) if bounds else []
+    return list(zip([after, *cuts], [*cuts, now]))
+
+
+def get_overdue_watermark(name=None):
+    name = name or OVERDUE_WATERMARK
+    return OverdueWatermark.objects.filter(pk=name).values_list('value', flat=True).first()
+
+
+def advance_overdue_watermark(value, name=None):
+    """Сдвинуть отметку вперёд; опоздавший проход с более ранним now её не откатит"""
+    table = OverdueWatermark._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (name, value) VALUES (%s, %s) "
+            f"ON CONFLICT (name) DO UPDATE SET value = GREATEST({table}.value, EXCLUDED.value)",
+            [name or OVERDUE_WATERMARK, value]
+        )
+
+
+def claim_notifications(rows):
+    """
+    Записывает (задача, срок) в журнал уведомлений одним INSERT ... ON CONFLICT DO NOTHING
+    и возвращает только строки, которых там ещё не было. rows — (task_id, ..., due_date).
+    """
+    if not rows:
+        return []
+    table = OverdueNotification._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (task_id, due_date) "
+            f"SELECT * FROM unnest(%s::varchar[], %s::timestamptz[]) "
+            f"ON CONFLICT (task_id, due_date) DO NOTHING RETURNING task_id",
+            [[row[0] for row in rows], [row[-1] for row in rows]]
+        )
+        claimed = {row[0] for row in cursor.fetchall()}
+    return [row for row in rows if row[0] in claimed]
+
+
+@shared_task
+def check_overdue_tasks(shards=None, notify=True):
+    """
+    Инкрементальный проход по просроченным задачам: смотрим только сроки в (отметка прошлого прохода, now],
+    а не весь хвост просроченных. Если шард упал, отметка остаётся на месте и следующий проход
+    повторит окно — повторов уведомлений не даст журнал.
+    notify — ставить уведомления; без него это только отчёт, отметка не сдвигается.
+    """
+    now = timezone.now()
+    watermark = get_overdue_watermark()
+    bounds = overdue_shard_bounds(now, shards or settings.OVERDUE_SHARDS, after=watermark)
+    return run_overdue_shards(now, bounds, notify, OVERDUE_WATERMARK)
+
+
+@shared_task
+def rescue_overdue_tasks(shards=None, notify=True):
+    """
+    Редкий проход по хвосту до отметки check_overdue_tasks: задачи, изменённые после прошлого
+    такого прохода, со сроком уже позади отметки — срок перенесли в прошлое или задачу снова
+    открыли, пока расписание в Redis было недоступно. Индекса по updated_at нет (он стоил бы
+    каждой записи задачи), поэтому хвост читается целиком по индексу due_date — отсюда и шарды.
+    """
+    now = timezone.now()
+    until = get_overdue_watermark()
+    if until is None:
+        # основной проход ещё не шёл — он сам возьмёт весь хвост
+        return {'skipped': True}
+    since = get_overdue_watermark(OVERDUE_RESCUE_WATERMARK)
+    bounds = overdue_shard_bounds(until, shards or settings.OVERDUE_SHARDS)
+    return run_overdue_shards(now, bounds, notify, OVERDUE_RESCUE_WATERMARK, updated_after=since)
+
+
+def run_overdue_shards(now, bounds, notify, watermark, updated_after=None):
+    """
+    Шарды идут группой на воркерах, сводку и сдвиг отметки watermark делает callback chord'а.
+    Один шард выполняется сразу, без chord.
+    """
+    shard_args = [
+        (after.isoformat() if after else None, until.isoformat(), notify,
+         updated_after.isoformat() if updated_after else None)
+        for after, until in bounds
+    ]
+    if len(shard_args) == 1:
+        return summarize_overdue([check_overdue_shard(*shard_args[0])], now.isoformat(), notify, watermark)
+
+    summary = chord(check_overdue_shard.s(*args) for args in shard_args)(
+        summarize_overdue.s(now.isoformat(), notify, watermark)
+    )
+    print(f"Проверка просроченных задач: запущено {len(shard_args)} шардов")
+    return {'checked_at': now.isoformat(), 'shards': len(shard_args), 'summary_id': summary.id}
+
 
+@shared_task
+def check_overdue_shard(after, until, notify=True, updated_after=None):
+    """
+    Один шард: задачи с due_date в (after, until]. По индексу due_date WHERE completed = false
+    читается только свой диапазон, в памяти — счётчики и одна пачка уведомлений.
+    Уведомление ставится, только если (задача, срок) ещё нет в журнале.
+    """
+    overdue_count = 0
+    notified = 0
+    oldest_due_date = None
+    batch = []
+
+    for row in iter_overdue_tasks(
+            datetime.fromisoformat(until),
+            after=datetime.fromisoformat(after) if after else None,
+            updated_after=datetime.fromisoformat(updated_after) if updated_after else None):
+        if oldest_due_date is None:
+            oldest_due_date = row[3]  # сортировка по due_date — первая самая старая
+        overdue_count += 1
+        if notify:
+            batch.append(row)
+            if len(batch) >= OVERDUE_CHUNK_SIZE:
+                notified += notify_overdue(batch)
+                batch = []
+
+    notified += notify_overdue(batch)
+    if notified:
+        schedule_flush()
+
+    return {
+        'overdue_count': overdue_count,
+        'oldest_due_date': oldest_due_date.isoformat() if oldest_due_date else None,
+        'notified': notified,
+    }
+
+
+def notify_overdue(rows):
+    """Поставить уведомления по строкам iter_overdue_tasks, которых нет в журнале; возвращает их число"""
+    claimed = claim_notifications(rows)
+    if claimed:
+        notifications.enqueue([(telegram_user_id, task_id, title)
+                               for task_id, title, telegram_user_id, _ in claimed])
+    return len(claimed)
+
+
+@shared_task
+def summarize_overdue(results, now, notify=True, watermark=OVERDUE_WATERMARK):
+    """Callback chord'а: короткая сводка по всем шардам и сдвиг отметки до now с запасом"""
+    if notify:
+        # due_date и updated_at выставляются до COMMIT: строка, сохранённая чуть раньше now,
+        # но закоммиченная после прохода, иначе не попала бы в следующее окно.
+        # Окна с запасом перекрываются, повторов уведомлений не даёт журнал
+        lag = timedelta(seconds=settings.OVERDUE_WATERMARK_LAG)
+        advance_overdue_watermark(datetime.fromisoformat(now) - lag, watermark)
+
+    oldest = min((result['oldest_due_date'] for result in results if result['oldest_due_date']),
+                  key=datetime.fromisoformat, default=None)
+    overdue_count = sum(result['overdue_count'] for result in results)
     result = {
-        'total_checked': Task.objects.count(),
-        'overdue_count': overdue_tasks.count(),
-        'tasks': []
+        'checked_at': now,
+        'shards': len(results),
+        'overdue_count': overdue_count,
+        'notified': sum(result['notified'] for result in results),
+        'oldest_due_date': oldest,
+        'max_overdue_by': (
+            (datetime.fromisoformat(now) - datetime.fromisoformat(oldest)).total_seconds() if oldest else 0
+        ),
     }
 
-    for task in overdue_tasks:
-        task_info = {
-            'id': task.id,
-            'title': task.title,
-            'telegram_user_id': task.telegram_user_id,
-            'due_date': task.due_date.isoformat() if task.due_date else None,
-            'overdue_by': (now - task.due_date).total_seconds() if task.due_date else 0
-        }
-        result['tasks'].append(task_info)
-
-        # Логирование в консоль (в production можно заменить на отправку в Telegram)
-        print(f"⚠️ Задача '{task.title}' просрочена!")
-        print(f"   Пользователь: {task.telegram_user_id}")
-        print(f"   Срок был: {task.due_date}")
-
-        # Здесь можно добавить отправку уведомления в Telegram
-        # Пример: send_telegram_notification.delay(task.telegram_user_id, task.title)
-
-    print(f"Проверка завершена. Найдено {overdue_tasks.count()} просроченных задач.")
+    print(f"Проверка завершена. Найдено {overdue_count} новых просроченных задач.")
     return result
 
 
+# сколько созревших задач диспетчер забирает за один запуск
+DISPATCH_BATCH_SIZE = 500
+
+
 @shared_task
-def send_telegram_notification(user_id, task_title, task_id=None):
+def dispatch_due_tasks(limit=DISPATCH_BATCH_SIZE):
     """
-    Задача для отправки уведомления в Telegram
-    В реальном проекте нужно настроить отправку через Telegram Bot API
+    Забирает из расписания только задачи, срок которых уже наступил,
+    и ставит уведомления. Запускается beat'ом раз в TASK_SCHEDULER_INTERVAL секунд.
     """
-    bot_token = getattr(settings, 'BOT_TOKEN', None)
+    now = timezone.now()
+    task_ids = scheduler.pop_due(now, limit)
+    if not task_ids:
+        return {'dispatched': 0}
+
+    # перепроверяем по базе: задачу могли выполнить или удалить после постановки
+    # и через журнал: о той же задаче с тем же сроком могла уже сообщить check_overdue_tasks
+    due_tasks = Task.objects.filter(
+        pk__in=task_ids,
+        due_date__lte=now,
+        completed=False
+    ).values_list('id', 'title', 'telegram_user_id', 'due_date')
 
-    if not bot_token:
+    dispatched = notify_overdue(list(due_tasks))
+    if dispatched:
+        schedule_flush()
+
+    # пачка забрана целиком — вероятно, в очереди есть ещё, дочищаем не дожидаясь beat
+    if len(task_ids) == limit:
+        dispatch_due_tasks.delay(limit)
+
+    return {'popped': len(task_ids), 'dispatched': dispatched}
+
+
+def schedule_flush():
+    """Запустить доставку; частые вызовы склеиваются в один запуск"""
+    if notifications.claim_flush_trigger():
+        flush_notifications.delay()
+
+
+@shared_task
+def send_telegram_notification(user_id, task_title, task_id=None):
+    """
+    Поставить уведомление в очередь доставки.
+    Уведомления одного пользователя склеиваются и уходят пачкой через flush_notifications.
+    """
+    if not settings.BOT_TOKEN:
         print(f"⚠️ Не могу отправить уведомление для задачи '{task_title}' - BOT_TOKEN не настроен")
         return False
 
-    message = f"⏰ Задача '{task_title}' просрочена!"
-
-    # Пример отправки через Telegram API
-    # try:
-    #     response = requests.post(
-    #         f"https://api.telegram.org/bot{bot_token}/sendMessage",
-    #         json={
-    #             'chat_id': user_id,
-    #             'text': message,
-    #             'parse_mode': 'HTML'
-    #         }
-    #     )
-    #     return response.status_code == 200
-    # except Exception as e:
-    #     print(f"Ошибка отправки уведомления: {e}")
-    #     return False
-
-    print(f"📨 Уведомление для пользователя {user_id}: {message}")
-    return True
\ No newline at end of file
+    notifications.enqueue([(user_id, task_id or task_title, task_title)])
+    schedule_flush()
+    return True
+
+
+@shared_task
+def flush_notifications():
+    """
+    Разобрать очередь уведомлений пачкой. Одновременно работает один flush;
+    на 429 и отсроченные чаты перепланируемся через countdown, а не спим.
+    """
+    lock = notifications.flush_lock()
+    if not lock.acquire(blocking=False):
+        return {'skipped': True}
+
+    try:
+        result = notifications.deliver_batch(settings.NOTIFY_BATCH_SIZE)
+    finally:
+        lock.release()
+    # после снятия блокировки: flush, запущенный enqueue, пока мы держали её, ушёл в skipped —
+    # его чаты видны здесь, а всё, что придёт позже, запустит свой flush
+    delay = notifications.next_delay()
+
+    if delay is not None:
+        flush_notifications.apply_async(countdown=max(delay, result['retry_after']))
+
+    print(f"📨 Отправлено уведомлений: {result['sent']}, отложено: {result['requeued']}")
+    return result
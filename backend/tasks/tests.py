@@ -1,3 +1,1084 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import threading
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import redis
+from prometheus_client import REGISTRY
+from config.celery import app as celery_app
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from . import notifications, scheduler
+from .ids import TimeSortableIdGenerator
+from .models import Category, OverdueNotification, OverdueWatermark, Task
+from .renderers import FastJSONParser, FastJSONRenderer
+from .serializers import TaskSerializer
+from .tasks import (
+    check_overdue_tasks, dispatch_due_tasks, flush_notifications, iter_overdue_tasks, overdue_shard_bounds,
+    rescue_overdue_tasks, summarize_overdue,
+)
+from .views import TaskViewSet
+
+USER_ID = 111
+
+# маршруты задач как под ASGI — для AsyncTaskViewTests (ROOT_URLCONF='tasks.tests')
+with override_settings(ASYNC_VIEWS=True):
+    urlpatterns = [
+        path('api/tasks/', TaskViewSet.as_view({'get': 'list', 'post': 'create'})),
+        path('api/tasks/overdue/', TaskViewSet.as_view({'get': 'overdue'})),
+        path('api/tasks/<str:pk>/', TaskViewSet.as_view({'get': 'retrieve', 'patch': 'partial_update'})),
+    ]
+
+
+def redis_available():
+    try:
+        return redis.Redis.from_url(settings.TASK_SCHEDULER_REDIS_URL, socket_connect_timeout=1).ping()
+    except redis.RedisError:
+        return False
+
+
+class TaskCursorPaginationTests(APITestCase):
+    def setUp(self):
+        base = timezone.now()
+        for i in range(7):
+            task = Task.objects.create(title=f'Задача {i}', telegram_user_id=USER_ID)
+            # две пары с одинаковым created_at — проверяем, что id разруливает равенство
+            Task.objects.filter(pk=task.pk).update(created_at=base - timedelta(minutes=i // 2))
+        Task.objects.create(title='Чужая', telegram_user_id=222)
+        self.expected = list(
+            Task.objects.filter(telegram_user_id=USER_ID)
+            .order_by('-created_at', '-id')
+            .values_list('id', flat=True)
+        )
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_walks_all_pages_without_count(self):
+        data = self.get('/api/tasks/', telegram_user_id=USER_ID, page_size=3)
+        self.assertNotIn('count', data)
+        self.assertIsNone(data['previous'])
+
+        seen = [task['id'] for task in data['results']]
+        while data['next']:
+            data = self.get(data['next'])
+            seen.extend(task['id'] for task in data['results'])
+
+        self.assertEqual(seen, self.expected)
+
+    def test_previous_link_returns_same_page(self):
+        first = self.get('/api/tasks/', telegram_user_id=USER_ID, page_size=3)
+        second = self.get(first['next'])
+        back = self.get(second['previous'])
+        self.assertEqual(back['results'], first['results'])
+        self.assertIsNone(back['previous'])
+
+    def test_count_on_request(self):
+        data = self.get('/api/tasks/', telegram_user_id=USER_ID, count='true')
+        self.assertEqual(data['count'], 7)
+
+    def test_page_number_fallback(self):
+        data = self.get('/api/tasks/', telegram_user_id=USER_ID, page=1)
+        self.assertEqual(data['count'], 7)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/tasks/', {'cursor': 'мусор'})
+        self.assertEqual(response.status_code, 404)
+
+
+class CheckOverdueTasksTests(APITestCase):
+    def test_summary_counts_only_open_overdue(self):
+        now = timezone.now()
+        Task.objects.create(title='Старая', telegram_user_id=USER_ID, due_date=now - timedelta(days=2))
+        Task.objects.create(title='Вчера', telegram_user_id=USER_ID, due_date=now - timedelta(days=1))
+        Task.objects.create(title='Сделана', telegram_user_id=USER_ID,
+                            due_date=now - timedelta(days=3), completed=True)
+        Task.objects.create(title='Завтра', telegram_user_id=USER_ID, due_date=now + timedelta(days=1))
+        Task.objects.create(title='Без срока', telegram_user_id=USER_ID)
+
+        with mock.patch.object(notifications, 'enqueue'), mock.patch('tasks.tasks.schedule_flush'):
+            result = check_overdue_tasks()
+
+        self.assertEqual(result['overdue_count'], 2)
+        self.assertEqual(result['notified'], 2)
+        self.assertGreaterEqual(result['max_overdue_by'], timedelta(days=2).total_seconds())
+        self.assertNotIn('tasks', result)
+
+    def test_batches_walk_ties_on_due_date(self):
+        due_date = timezone.now() - timedelta(hours=1)
+        for i in range(5):
+            Task.objects.create(title=f'Задача {i}', telegram_user_id=USER_ID, due_date=due_date)
+        Task.objects.create(title='Раньше', telegram_user_id=USER_ID, due_date=due_date - timedelta(hours=1))
+
+        with mock.patch('tasks.tasks.OVERDUE_CHUNK_SIZE', 2):
+            rows = list(iter_overdue_tasks(timezone.now()))
+
+        self.assertEqual([row[0] for row in rows],
+                         list(Task.objects.order_by('due_date', 'id').values_list('id', flat=True)))
+
+    def sweep(self, now, task=check_overdue_tasks):
+        with mock.patch('tasks.tasks.timezone.now', return_value=now), \
+                mock.patch.object(notifications, 'enqueue') as enqueue, \
+                mock.patch('tasks.tasks.schedule_flush'):
+            result = task(shards=1)
+        notified = [task_id for call in enqueue.call_args_list for _, task_id, _ in call.args[0]]
+        return result, notified
+
+    def test_watermark_ledger_and_rearm(self):
+        start = timezone.now()
+        old = Task.objects.create(title='Старая', telegram_user_id=USER_ID, due_date=start - timedelta(days=1))
+        soon = Task.objects.create(title='Скоро', telegram_user_id=USER_ID, due_date=start + timedelta(hours=1))
+        now = timezone.now()
+
+        # первый проход — весь хвост, дальше только окно после отметки
+        result, notified = self.sweep(now)
+        self.assertEqual((result['overdue_count'], notified), (1, [old.id]))
+        lag = timedelta(seconds=settings.OVERDUE_WATERMARK_LAG)
+        self.assertEqual(OverdueWatermark.objects.get().value, now - lag)
+
+        result, notified = self.sweep(now + timedelta(hours=2))
+        self.assertEqual((result['overdue_count'], notified), (1, [soon.id]))
+
+        # перенос срока снова взводит задачу
+        old.due_date = now + timedelta(hours=3)
+        old.save()
+        result, notified = self.sweep(now + timedelta(hours=4))
+        self.assertEqual(notified, [old.id])
+        self.assertEqual(OverdueNotification.objects.filter(task=old).count(), 2)
+
+        # срок задним числом, за уже пройденной отметкой — окно его не видит, подбирает редкий проход по хвосту
+        late = Task.objects.create(title='Задним числом', telegram_user_id=USER_ID,
+                                   due_date=now + timedelta(hours=1))
+        Task.objects.filter(pk=late.pk).update(updated_at=now + timedelta(hours=5))
+        result, notified = self.sweep(now + timedelta(hours=6))
+        self.assertEqual(notified, [])
+        result, notified = self.sweep(now + timedelta(hours=6), task=rescue_overdue_tasks)
+        self.assertEqual(notified, [late.id])
+        self.assertEqual(OverdueWatermark.objects.get(pk='overdue-rescue').value, now + timedelta(hours=6) - lag)
+
+        # следующий проход по хвосту берёт только изменённое после прошлого
+        result, notified = self.sweep(now + timedelta(hours=7), task=rescue_overdue_tasks)
+        self.assertEqual((result['overdue_count'], notified), (0, []))
+        OverdueWatermark.objects.filter(pk='overdue-rescue').delete()
+
+        # закоммиченная после прохода запись с updated_at раньше его now: отметка с запасом её не теряет
+        committed_late = Task.objects.create(title='Поздний коммит', telegram_user_id=USER_ID,
+                                             due_date=now + timedelta(hours=5, minutes=59, seconds=50))
+        Task.objects.filter(pk=committed_late.pk).update(
+            updated_at=now + timedelta(hours=5, minutes=59, seconds=55))
+        result, notified = self.sweep(now + timedelta(hours=6, minutes=1))
+        self.assertEqual(notified, [committed_late.id])
+
+        # повтор того же окна ничего не шлёт
+        OverdueWatermark.objects.update(value=now)
+        result, notified = self.sweep(now + timedelta(hours=6, minutes=1))
+        self.assertEqual((result['overdue_count'], notified), (4, []))
+
+        # отчёт без уведомлений отметку не двигает
+        with mock.patch('tasks.tasks.timezone.now', return_value=now + timedelta(hours=7)):
+            check_overdue_tasks(shards=1, notify=False)
+        self.assertEqual(OverdueWatermark.objects.get(pk='overdue').value, now + timedelta(hours=6, minutes=1) - lag)
+
+    def test_shards_cover_every_task_once(self):
+        now = timezone.now()
+        for i in range(300):
+            Task.objects.create(title=f'Задача {i}', telegram_user_id=USER_ID + i % 7,
+                                due_date=now - timedelta(minutes=i * i), completed=i % 5 == 0)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Task._meta.db_table}')
+
+        bounds = overdue_shard_bounds(now, 4)
+        self.assertEqual(len(bounds), 4)
+        self.assertIsNone(bounds[0][0])
+        self.assertEqual(bounds[-1][1], now)
+        self.assertEqual([after for after, _ in bounds[1:]], [until for _, until in bounds[:-1]])
+
+        # разрезы окна — только внутри него; узкое окно остаётся одним шардом
+        window = overdue_shard_bounds(now, 4, after=now - timedelta(days=3))
+        self.assertEqual(window[0][0], now - timedelta(days=3))
+        self.assertEqual(len(window), 4)
+        self.assertTrue(all(after < until for after, until in window))
+        self.assertEqual(overdue_shard_bounds(now, 4, after=now - timedelta(seconds=1)),
+                         [(now - timedelta(seconds=1), now)])
+
+        # шарды и итог выполняются на месте, без воркера
+        eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', eager)
+        with mock.patch.object(notifications, 'enqueue') as enqueue, \
+                mock.patch('tasks.tasks.schedule_flush'), \
+                mock.patch('tasks.tasks.summarize_overdue.run', wraps=summarize_overdue.run) as summarize:
+            started = check_overdue_tasks(shards=4, notify=True)
+        self.assertEqual(started['shards'], 4)
+
+        shard_results = summarize.call_args.args[0]
+        self.assertEqual([result['overdue_count'] for result in shard_results].count(0), 0)
+        summary = summarize_overdue(shard_results, now.isoformat())
+        self.assertEqual(summary['overdue_count'], 240)
+        notified = [task_id for call in enqueue.call_args_list for _, task_id, _ in call.args[0]]
+        self.assertEqual(sorted(notified), sorted(Task.objects.filter(completed=False).values_list('id', flat=True)))
+
+
+@unittest.skipUnless(redis_available(), 'Redis недоступен')
+@override_settings(TASK_SCHEDULER_KEY='tasks:due:test')
+# расписание пишется в on_commit — нужны настоящие коммиты, а не откат TestCase
+class DueDateSchedulerTests(APITransactionTestCase):
+    def setUp(self):
+        self.redis = scheduler.get_client()
+        self.redis.delete(settings.TASK_SCHEDULER_KEY)
+
+    def tearDown(self):
+        self.redis.delete(settings.TASK_SCHEDULER_KEY)
+
+    def create(self, **data):
+        payload = {'title': 'Задача', 'telegram_user_id': USER_ID, **data}
+        response = self.client.post('/api/tasks/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def score(self, task_id):
+        return self.redis.zscore(settings.TASK_SCHEDULER_KEY, task_id)
+
+    def test_create_update_complete_delete(self):
+        due = timezone.now() + timedelta(hours=1)
+        task_id = self.create(due_date=due.isoformat())
+        self.assertAlmostEqual(self.score(task_id), due.timestamp(), places=3)
+
+        later = due + timedelta(hours=1)
+        self.client.patch(f'/api/tasks/{task_id}/', {'due_date': later.isoformat()}, format='json')
+        self.assertAlmostEqual(self.score(task_id), later.timestamp(), places=3)
+
+        self.client.patch(f'/api/tasks/{task_id}/', {'completed': True}, format='json')
+        self.assertIsNone(self.score(task_id))
+
+        self.client.patch(f'/api/tasks/{task_id}/', {'completed': False}, format='json')
+        self.client.delete(f'/api/tasks/{task_id}/')
+        self.assertIsNone(self.score(task_id))
+
+    def test_waits_for_commit(self):
+        due = timezone.now() + timedelta(hours=1)
+        serializer = TaskSerializer(data={'title': 'Задача', 'telegram_user_id': USER_ID, 'due_date': due})
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            task = serializer.save()
+            self.assertIsNone(self.score(task.pk))
+        self.assertIsNotNone(self.score(task.pk))
+
+        with transaction.atomic():
+            serializer = TaskSerializer(task, data={'due_date': None}, partial=True)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            transaction.set_rollback(True)
+        # откатили — срок в базе прежний, и расписание его не потеряло
+        self.assertIsNotNone(self.score(task.pk))
+
+    def test_toggle_complete_syncs_schedule(self):
+        task_id = self.create(due_date=(timezone.now() + timedelta(hours=1)).isoformat())
+        self.client.post(f'/api/tasks/{task_id}/toggle_complete/')
+        self.assertIsNone(self.score(task_id))
+        self.client.post(f'/api/tasks/{task_id}/toggle_complete/')
+        self.assertIsNotNone(self.score(task_id))
+
+    def test_admin_edits_sync_schedule(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        task_id = self.create(due_date=(timezone.now() + timedelta(hours=1)).isoformat())
+        later = timezone.localtime(timezone.now() + timedelta(days=1)).replace(second=0, microsecond=0)
+        response = self.client.post(f'/admin/tasks/task/{task_id}/change/', {
+            'title': 'Задача', 'description': '', 'telegram_user_id': USER_ID,
+            'due_date_0': later.strftime('%Y-%m-%d'), 'due_date_1': later.strftime('%H:%M:%S'),
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertAlmostEqual(self.score(task_id), later.timestamp(), places=3)
+
+        self.client.post('/admin/tasks/task/',
+                         {'action': 'delete_selected', '_selected_action': [task_id], 'post': 'yes'})
+        self.assertFalse(Task.objects.filter(pk=task_id).exists())
+        self.assertIsNone(self.score(task_id))
+
+    def test_backs_off_while_redis_is_down(self):
+        self.addCleanup(setattr, scheduler, '_down_until', 0.0)
+        client = mock.Mock()
+        client.zadd.side_effect = redis.ConnectionError('Redis недоступен')
+        with mock.patch.object(scheduler, 'get_request_client', return_value=client):
+            scheduler.schedule('a', timezone.now())
+            scheduler.schedule('b', timezone.now())
+            scheduler.unschedule('b')
+        # после первой ошибки расписание не трогается, запросы не ждут Redis
+        self.assertEqual(client.zadd.call_count, 1)
+        client.zrem.assert_not_called()
+
+    def test_task_without_due_date_not_scheduled(self):
+        task_id = self.create()
+        self.assertIsNone(self.score(task_id))
+
+    def test_dispatch_pops_only_due(self):
+        now = timezone.now()
+        due_id = self.create(due_date=(now - timedelta(seconds=1)).isoformat())
+        future_id = self.create(due_date=(now + timedelta(hours=1)).isoformat())
+
+        with override_settings(NOTIFY_KEY_PREFIX='notify:test'), \
+                mock.patch.object(flush_notifications, 'delay') as flush:
+            self.redis.delete('notify:test:trigger')
+            result = dispatch_due_tasks()
+            pending = self.redis.hgetall(f'notify:test:pending:{USER_ID}')
+            self.redis.delete('notify:test:chats', f'notify:test:pending:{USER_ID}', 'notify:test:trigger')
+
+        self.assertEqual(result, {'popped': 1, 'dispatched': 1})
+        self.assertTrue(OverdueNotification.objects.filter(task_id=due_id).exists())
+        self.assertEqual(pending, {due_id: 'Задача'})
+        flush.assert_called_once_with()
+        self.assertIsNone(self.score(due_id))
+        self.assertIsNotNone(self.score(future_id))
+
+
+class StubBotAPI(BaseHTTPRequestHandler):
+    """Локальная заглушка Bot API: запоминает запросы, отвечает из очереди ответов"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.calls.append(body)
+        status, payload = self.server.responses.pop(0) if self.server.responses else (200, {'ok': True})
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@unittest.skipUnless(redis_available(), 'Redis недоступен')
+class TokenBucketTests(unittest.TestCase):
+    key = 'notify:test:bucket'
+
+    def setUp(self):
+        scheduler.get_client().delete(self.key)
+        self.addCleanup(scheduler.get_client().delete, self.key)
+
+    def test_refills_at_rate(self):
+        now = [1000.0]
+        bucket = notifications.TokenBucket(self.key, rate=2, capacity=2, clock=lambda: now[0])
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertAlmostEqual(bucket.try_acquire(), 0.5)
+        now[0] += 0.5
+        self.assertEqual(bucket.try_acquire(), 0)
+
+    def test_shared_between_processes(self):
+        # у каждого процесса prefork свой объект, состояние одно — в Redis
+        now = [1000.0]
+        first = notifications.TokenBucket(self.key, rate=1, capacity=1, clock=lambda: now[0])
+        second = notifications.TokenBucket(self.key, rate=1, capacity=1, clock=lambda: now[0])
+        self.assertEqual(first.try_acquire(), 0)
+        self.assertAlmostEqual(second.try_acquire(), 1)
+
+
+@unittest.skipUnless(redis_available(), 'Redis недоступен')
+class NotificationDeliveryTests(unittest.TestCase):
+    prefix = 'notify:test'
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubBotAPI)
+        self.server.calls = []
+        self.server.responses = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.settings = override_settings(
+            BOT_TOKEN='test-token',
+            TELEGRAM_API_URL=f'http://127.0.0.1:{self.server.server_port}',
+            NOTIFY_KEY_PREFIX=self.prefix,
+        )
+        self.settings.enable()
+        self.redis = scheduler.get_client()
+        self.clear()
+
+    def tearDown(self):
+        self.clear()
+        self.settings.disable()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def clear(self):
+        keys = self.redis.keys(f'{self.prefix}:*')
+        if keys:
+            self.redis.delete(*keys)
+
+    def test_coalesces_per_chat(self):
+        notifications.enqueue([
+            (1, 'a', 'Первая'),
+            (1, 'b', 'Вторая <b>'),
+            (1, 'a', 'Первая'),
+            (2, 'c', 'Третья'),
+        ])
+
+        result = notifications.deliver_batch(limit=10)
+
+        self.assertEqual(result['sent'], 2)
+        calls = {call['chat_id']: call['text'] for call in self.server.calls}
+        self.assertIn('Просрочено задач: 2', calls['1'])
+        self.assertIn('Вторая &lt;b&gt;', calls['1'])
+        self.assertEqual(calls['2'], "⏰ Задача 'Третья' просрочена!")
+        self.assertIsNone(notifications.next_delay())
+
+    def test_flood_requeues_without_sleeping(self):
+        self.server.responses = [(429, {'ok': False, 'error_code': 429, 'parameters': {'retry_after': 7}})]
+        notifications.enqueue([(1, 'a', 'Первая')])
+
+        with mock.patch.object(flush_notifications, 'apply_async') as apply_async:
+            result = flush_notifications()
+
+        self.assertEqual(result['retry_after'], 7)
+        self.assertEqual(self.redis.hgetall(f'{self.prefix}:pending:1'), {'a': 'Первая'})
+        countdown = apply_async.call_args.kwargs['countdown']
+        self.assertGreater(countdown, 6)
+
+    def test_bad_token_requeues(self):
+        self.server.responses = [(401, {'ok': False, 'error_code': 401, 'description': 'Unauthorized'})]
+        notifications.enqueue([(1, 'a', 'Первая')])
+
+        with mock.patch.object(flush_notifications, 'apply_async') as apply_async:
+            result = flush_notifications()
+
+        self.assertEqual((result['dropped'], result['requeued']), (0, 1))
+        self.assertEqual(self.redis.hgetall(f'{self.prefix}:pending:1'), {'a': 'Первая'})
+        self.assertGreaterEqual(apply_async.call_args.kwargs['countdown'], notifications.CONFIG_ERROR_DELAY)
+
+    def test_blocked_chat_is_dropped(self):
+        self.server.responses = [(403, {'ok': False, 'description': 'bot was blocked by the user'})]
+        notifications.enqueue([(1, 'a', 'Первая')])
+
+        result = notifications.deliver_batch(limit=10)
+
+        self.assertEqual(result['dropped'], 1)
+        self.assertIsNone(notifications.next_delay())
+
+    def test_claimed_survives_crash(self):
+        notifications.enqueue([(1, 'a', 'Первая')])
+        with override_settings(NOTIFY_LOCK_TIMEOUT=-1):
+            self.assertEqual(notifications.claim(limit=10), {'1': {'a': 'Первая'}})
+        # воркер упал, не дойдя до отправки: после дедлайна задача снова в очереди
+        notifications.enqueue([(1, 'b', 'Вторая')])
+
+        self.assertEqual(notifications.claim(limit=10), {'1': {'a': 'Первая', 'b': 'Вторая'}})
+        self.assertEqual(notifications.deliver_batch(limit=10)['sent'], 0)
+
+    def test_sent_clears_processing(self):
+        notifications.enqueue([(1, 'a', 'Первая')])
+        notifications.deliver_batch(limit=10)
+        self.assertEqual(self.redis.keys(f'{self.prefix}:processing*'), [])
+
+    def test_enqueue_during_flush_is_rescheduled(self):
+        notifications.enqueue([(1, 'a', 'Первая')])
+        deliver_batch = notifications.deliver_batch
+
+        def deliver(limit):
+            result = deliver_batch(limit)
+            # пока держим блокировку, пришло новое уведомление, а его flush ушёл в skipped
+            notifications.enqueue([(2, 'b', 'Вторая')])
+            self.assertEqual(flush_notifications(), {'skipped': True})
+            return result
+
+        with mock.patch.object(notifications, 'deliver_batch', deliver), \
+                mock.patch.object(flush_notifications, 'apply_async') as apply_async:
+            flush_notifications()
+
+        self.assertEqual(apply_async.call_args.kwargs['countdown'], 0)
+
+
+class ConditionalListTests(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Работа')
+        self.task = Task.objects.create(title='Задача', telegram_user_id=USER_ID)
+        self.task.categories.set([self.category])
+
+    def assert_revalidates(self, url, change):
+        first = self.client.get(url)
+        etag = first['ETag']
+        self.assertTrue(etag.startswith('"'))
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], etag)
+
+        change()
+        fresh = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh['ETag'], etag)
+
+    def test_categories(self):
+        self.assert_revalidates('/api/categories/', lambda: Category.objects.create(name='Дом'))
+
+    def test_task_list_changes_on_task_update(self):
+        def change():
+            self.task.title = 'Другая'
+            self.task.save()
+        self.assert_revalidates(f'/api/tasks/?telegram_user_id={USER_ID}', change)
+
+    def test_task_list_changes_on_category_rename(self):
+        def change():
+            self.category.name = 'Офис'
+            self.category.save()
+        self.assert_revalidates(f'/api/tasks/?telegram_user_id={USER_ID}', change)
+
+    def test_task_list_changes_on_delete(self):
+        Task.objects.create(title='Ещё', telegram_user_id=USER_ID)
+        self.assert_revalidates(f'/api/tasks/?telegram_user_id={USER_ID}', self.task.delete)
+
+    def test_task_list_changes_on_raw_update(self):
+        # версию двигает триггер в базе, а не код API
+        self.assert_revalidates(f'/api/tasks/?telegram_user_id={USER_ID}',
+                                lambda: self.client.post(f'/api/tasks/{self.task.pk}/toggle_complete/'))
+
+    def test_version_check_does_not_count_tasks(self):
+        url = f'/api/tasks/?telegram_user_id={USER_ID}'
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertFalse(any('"tasks_task"' in query['sql'] for query in queries))
+
+    def test_etag_depends_on_query(self):
+        first = self.client.get(f'/api/tasks/?telegram_user_id={USER_ID}')
+        other = self.client.get('/api/tasks/?telegram_user_id=222')
+        self.assertNotEqual(first['ETag'], other['ETag'])
+
+
+class TaskSearchTests(APITestCase):
+    def setUp(self):
+        self.in_title = Task.objects.create(title='Купить молоко', telegram_user_id=USER_ID)
+        self.in_description = Task.objects.create(
+            title='Магазин', description='не забыть молоко и хлеб', telegram_user_id=USER_ID
+        )
+        Task.objects.create(title='Позвонить маме', telegram_user_id=USER_ID)
+        Task.objects.create(title='Купить молоко', telegram_user_id=222)
+
+    def search(self, **params):
+        response = self.client.get('/api/tasks/', {'telegram_user_id': USER_ID, **params})
+        self.assertEqual(response.status_code, 200)
+        return [task['id'] for task in response.json()['results']]
+
+    def test_ranked_by_relevance_within_user(self):
+        # совпадение в заголовке (вес A) выше, чем в описании (вес B)
+        self.assertEqual(self.search(search='молоко'), [self.in_title.pk, self.in_description.pk])
+
+    def test_russian_stemming(self):
+        self.assertEqual(self.search(search='молока'), [self.in_title.pk, self.in_description.pk])
+
+    def test_prefix_of_last_word(self):
+        self.assertEqual(self.search(search='купить мол'), [self.in_title.pk])
+
+    def test_operators_are_not_passed_to_tsquery(self):
+        self.assertEqual(self.search(search="молоко & !'"), [self.in_title.pk, self.in_description.pk])
+        self.assertEqual(len(self.search(search='&!')), 3)
+
+    def test_explicit_ordering_wins(self):
+        found = self.search(search='молоко', ordering='created_at')
+        self.assertEqual(found, [self.in_title.pk, self.in_description.pk])
+        found = self.search(search='молоко', ordering='-created_at')
+        self.assertEqual(found, [self.in_description.pk, self.in_title.pk])
+
+
+class QueryCountTests(APITestCase):
+    """
+    Чтение не должно зависеть от размера страницы: если число запросов
+    начало расти вместе с числом задач — где-то вернулся N+1.
+    """
+
+    def setUp(self):
+        work = Category.objects.create(name='Работа')
+        home = Category.objects.create(name='Дом')
+        for i in range(25):
+            task = Task.objects.create(title=f'Задача {i}', telegram_user_id=USER_ID)
+            task.categories.set([work, home])
+        self.task = task
+
+    def assert_list_queries(self, expected, **params):
+        for page_size in (1, 5, 20):
+            with self.assertNumQueries(expected):
+                response = self.client.get('/api/tasks/', {'telegram_user_id': USER_ID, 'page_size': page_size, **params})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['results']), page_size)
+
+    def test_list(self):
+        # версия задач + версия категорий (ETag), страница, категории страницы
+        self.assert_list_queries(4)
+
+    def test_list_with_count(self):
+        self.assert_list_queries(5, count='true')
+
+    def test_list_not_modified(self):
+        etag = self.client.get('/api/tasks/', {'telegram_user_id': USER_ID})['ETag']
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/tasks/', {'telegram_user_id': USER_ID}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_retrieve(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/tasks/{self.task.pk}/')
+        self.assertEqual(len(response.json()['categories']), 2)
+
+    def test_categories_list(self):
+        with self.assertNumQueries(3):
+            self.client.get('/api/categories/')
+
+
+class TaskStatsTests(APITestCase):
+    def test_counts_in_one_query(self):
+        work = Category.objects.create(name='Работа')
+        home = Category.objects.create(name='Дом')
+        past = timezone.now() - timedelta(days=1)
+        both = Task.objects.create(title='Обе категории', telegram_user_id=USER_ID, due_date=past)
+        both.categories.set([work, home])
+        done = Task.objects.create(title='Выполнена', telegram_user_id=USER_ID, due_date=past, completed=True)
+        done.categories.set([work])
+        Task.objects.create(title='Без категорий', telegram_user_id=USER_ID)
+        Task.objects.create(title='Чужая', telegram_user_id=USER_ID + 1)
+
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/tasks/stats/', {'telegram_user_id': USER_ID}).json()
+        self.assertEqual({key: data[key] for key in ('total', 'completed', 'pending', 'overdue', 'uncategorized')},
+                         {'total': 3, 'completed': 1, 'pending': 2, 'overdue': 1, 'uncategorized': 1})
+        self.assertEqual(data['categories'], [
+            {'id': home.pk, 'name': 'Дом', 'total': 1, 'completed': 0, 'pending': 1, 'overdue': 1},
+            {'id': work.pk, 'name': 'Работа', 'total': 2, 'completed': 1, 'pending': 1, 'overdue': 1},
+        ])
+
+    def test_empty_and_invalid_user(self):
+        data = self.client.get('/api/tasks/stats/', {'telegram_user_id': USER_ID}).json()
+        self.assertEqual((data['total'], data['categories']), (0, []))
+        self.assertEqual(self.client.get('/api/tasks/stats/').status_code, 400)
+
+
+class ToggleAndOverdueTests(APITestCase):
+    def test_toggle_is_one_update(self):
+        task = Task.objects.create(title='Задача', telegram_user_id=USER_ID)
+        with self.assertNumQueries(1):
+            response = self.client.post(f'/api/tasks/{task.pk}/toggle_complete/')
+        self.assertEqual(response.json(), {'id': task.pk, 'completed': True})
+        updated = Task.objects.get(pk=task.pk)
+        self.assertTrue(updated.completed)
+        self.assertGreater(updated.updated_at, task.updated_at)
+
+        response = self.client.post(f'/api/tasks/{task.pk}/toggle_complete/?telegram_user_id={USER_ID + 1}')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.post('/api/tasks/нет/toggle_complete/').status_code, 404)
+
+    def test_overdue_keyset_pages(self):
+        now = timezone.now()
+        expected = []
+        for i in range(5):
+            # две задачи с одинаковым сроком — курсор должен развести их по id
+            task = Task.objects.create(title=f'Просрочена {i}', telegram_user_id=USER_ID,
+                                       due_date=now - timedelta(hours=5 - i // 2 * 2))
+            expected.append(task)
+        expected.sort(key=lambda task: (task.due_date, task.pk))
+        Task.objects.create(title='Выполнена', telegram_user_id=USER_ID, due_date=now - timedelta(hours=1), completed=True)
+        Task.objects.create(title='Будущая', telegram_user_id=USER_ID, due_date=now + timedelta(hours=1))
+        Task.objects.create(title='Чужая', telegram_user_id=USER_ID + 1, due_date=now - timedelta(hours=1))
+
+        seen = []
+        url = f'/api/tasks/overdue/?telegram_user_id={USER_ID}&page_size=2&fields=id,due_date'
+        while url:
+            # страница и без категорий — один запрос
+            with self.assertNumQueries(1):
+                data = self.client.get(url).json()
+            seen.extend(task['id'] for task in data['results'])
+            url = data['next']
+        self.assertEqual(seen, [task.pk for task in expected])
+
+    def test_overdue_requires_user(self):
+        self.assertEqual(self.client.get('/api/tasks/overdue/').status_code, 400)
+        self.assertEqual(self.client.get('/api/tasks/overdue/?telegram_user_id=x').status_code, 400)
+
+
+class PartialUpdateTests(APITestCase):
+    def setUp(self):
+        self.work = Category.objects.create(name='Работа')
+        self.home = Category.objects.create(name='Дом')
+        self.task = Task.objects.create(title='Задача', description='Описание', telegram_user_id=USER_ID)
+        self.task.categories.set([self.work])
+        self.url = f'/api/tasks/{self.task.pk}/'
+
+    def patch(self, data, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, data, format='json', headers=headers)
+        writes = [query['sql'] for query in queries if query['sql'].startswith(('UPDATE', 'INSERT', 'DELETE'))]
+        return response, writes
+
+    def test_writes_only_changed_columns(self):
+        response, writes = self.patch({'title': 'Новая', 'description': 'Описание'})
+        self.assertEqual(response.json()['title'], 'Новая')
+        self.assertEqual(len(writes), 1)
+        self.assertIn('"title"', writes[0])
+        self.assertNotIn('"description"', writes[0])
+
+        response, writes = self.patch({'title': 'Новая', 'category_ids': [self.work.pk]})
+        self.assertEqual((response.status_code, writes), (200, []))
+
+    def test_categories_diff(self):
+        response, writes = self.patch({'category_ids': [self.home.pk]})
+        self.assertEqual([category['id'] for category in response.json()['categories']], [self.home.pk])
+        self.assertEqual([sql.split()[0] for sql in writes], ['DELETE', 'INSERT', 'UPDATE'])
+        self.assertEqual(list(self.task.categories.values_list('pk', flat=True)), [self.home.pk])
+
+    def test_if_match(self):
+        etag = self.client.get(self.url)['ETag']
+        response, _ = self.patch({'title': 'Первая правка'}, if_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        response, writes = self.patch({'title': 'Вторая правка'}, if_match=etag)
+        self.assertEqual((response.status_code, writes), (412, []))
+        self.assertEqual(Task.objects.get(pk=self.task.pk).title, 'Первая правка')
+
+    def test_compares_against_locked_row(self):
+        # чужая запись между чтением и блокировкой: сравнивать надо с ней, а не с прочитанной копией
+        etag = self.client.get(self.url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, {'title': 'Задача'}, format='json', headers={'if_match': etag})
+        self.assertEqual(response.status_code, 200)
+        reads = [query['sql'] for query in queries
+                 if query['sql'].startswith('SELECT') and '"tasks_task"."title"' in query['sql']]
+        self.assertEqual(len(reads), 1)
+        self.assertIn('FOR UPDATE', reads[0])
+
+        Task.objects.filter(pk=self.task.pk).update(title='Чужая правка', updated_at=timezone.now())
+        etag = self.client.get(self.url)['ETag']
+        response, _ = self.patch({'title': 'Задача'}, if_match=etag)
+        self.assertEqual(response.json()['title'], 'Задача')
+        self.assertEqual(Task.objects.get(pk=self.task.pk).title, 'Задача')
+
+
+class SparseFieldsTests(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Работа')
+        self.task = Task.objects.create(title='Задача', description='Длинное описание' * 50,
+                                        telegram_user_id=USER_ID, due_date=timezone.now())
+        self.task.categories.set([self.category])
+
+    def get_results(self, **params):
+        response = self.client.get('/api/tasks/', {'telegram_user_id': USER_ID, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_default_matches_model_serializer(self):
+        task = Task.objects.prefetch_related('categories').get(pk=self.task.pk)
+        expected = json.loads(json.dumps(TaskSerializer(task).data))
+        self.assertEqual(self.get_results(), [expected])
+        self.assertEqual(self.client.get(f'/api/tasks/{self.task.pk}/').json(), self.get_results()[0])
+
+    def test_fields_narrow_sql_and_json(self):
+        with CaptureQueriesContext(connection) as queries:
+            results = self.get_results(fields='id,title')
+        self.assertEqual(results, [{'id': self.task.pk, 'title': 'Задача'}])
+        page_sql = next(query['sql'] for query in queries if 'LIMIT' in query['sql'])
+        self.assertNotIn('"description"', page_sql)
+        self.assertFalse(any('tasks_task_categories' in query['sql'] for query in queries))
+
+    def test_categories_ids_or_expanded(self):
+        self.assertEqual(self.get_results(fields='id,categories')[0]['categories'], [self.category.pk])
+        expanded = self.get_results(fields='id', expand='categories')[0]
+        self.assertEqual(list(expanded), ['id', 'categories'])
+        self.assertEqual(expanded['categories'][0]['name'], 'Работа')
+
+    def test_unknown_fields(self):
+        response = self.client.get('/api/tasks/', {'telegram_user_id': USER_ID, 'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['fields'][0])
+        response = self.client.get('/api/tasks/', {'expand': 'title'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkTaskTests(APITestCase):
+    def setUp(self):
+        self.work = Category.objects.create(name='Работа')
+        self.home = Category.objects.create(name='Дом')
+
+    def post(self, payload):
+        return self.client.post('/api/tasks/bulk/', payload, format='json')
+
+    def test_create_with_per_item_errors(self):
+        response = self.post([
+            {'title': 'Первая', 'telegram_user_id': USER_ID, 'category_ids': [self.work.pk, self.home.pk]},
+            {'title': 'Без пользователя'},
+            {'title': 'Чужая категория', 'telegram_user_id': USER_ID, 'category_ids': ['nope']},
+            {'title': 'Вторая', 'telegram_user_id': USER_ID},
+        ])
+
+        self.assertEqual(response.status_code, 207)
+        data = response.json()
+        self.assertEqual(data['created'], 2)
+        results = data['results']
+        self.assertIn('telegram_user_id', results[1]['errors'])
+        self.assertIn('category_ids', results[2]['errors'])
+
+        first = Task.objects.get(pk=results[0]['id'])
+        self.assertEqual(set(first.categories.values_list('name', flat=True)), {'Работа', 'Дом'})
+        self.assertTrue(Task.objects.filter(pk=results[3]['id'], title='Вторая').exists())
+
+    def test_update_replaces_categories(self):
+        task = Task.objects.create(title='Старая', telegram_user_id=USER_ID)
+        task.categories.set([self.work])
+        before = task.updated_at
+
+        response = self.post([{'id': task.pk, 'title': 'Новая', 'category_ids': [self.home.pk]}])
+
+        self.assertEqual(response.status_code, 201)
+        task.refresh_from_db()
+        self.assertEqual(task.title, 'Новая')
+        self.assertGreater(task.updated_at, before)
+        self.assertEqual(list(task.categories.values_list('name', flat=True)), ['Дом'])
+
+    def test_query_count_does_not_grow_with_batch(self):
+        def payload(n):
+            return [{'title': f'Задача {i}', 'telegram_user_id': USER_ID, 'category_ids': [self.work.pk]}
+                    for i in range(n)]
+
+        # категории, savepoint, INSERT задач, INSERT связей, release
+        with self.assertNumQueries(5):
+            self.post(payload(5))
+        with self.assertNumQueries(5):
+            self.post(payload(50))
+
+    def test_invalid_ids_reported_per_item(self):
+        task = Task.objects.create(id='12345', title='Старая', telegram_user_id=USER_ID)
+        response = self.post([{'id': ['x'], 'title': 'Список'}, {'id': {'pk': 1}}, {'id': True},
+                              {'id': 12345, 'title': 'Новая'}])
+
+        self.assertEqual(response.status_code, 207)
+        results = response.json()['results']
+        for result in results[:3]:
+            self.assertIn('id', result['errors'])
+        self.assertEqual(results[3], {'index': 3, 'id': task.pk})
+        self.assertEqual(Task.objects.get(pk=task.pk).title, 'Новая')
+
+    def test_rejects_non_list(self):
+        response = self.post({'title': 'Одна'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ROOT_URLCONF='tasks.tests')
+class AsyncTaskViewTests(APITestCase):
+    """Async-путь должен отвечать так же, как синхронный ViewSet"""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Работа')
+        for i in range(3):
+            task = Task.objects.create(title=f'Задача {i}', telegram_user_id=USER_ID)
+            task.categories.set([self.category])
+        self.task = task
+
+    def test_views_are_async(self):
+        self.assertTrue(all(asyncio.iscoroutinefunction(pattern.callback) for pattern in urlpatterns))
+
+    def test_list_matches_sync_path(self):
+        params = {'telegram_user_id': USER_ID, 'page_size': 2}
+        # версия задач + версия категорий (ETag), страница, категории страницы
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/tasks/', params)
+        with override_settings(ROOT_URLCONF='config.urls'):
+            expected = self.client.get('/api/tasks/', params)
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(response['ETag'], expected['ETag'])
+
+        following = self.client.get(response.json()['next'])
+        self.assertEqual(len(following.json()['results']), 1)
+
+        cached = self.client.get('/api/tasks/', params, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_sparse_fields(self):
+        params = {'telegram_user_id': USER_ID, 'fields': 'id,title,categories'}
+        # без категорий-объектов: в prefetch только id из связи
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/tasks/', params)
+        with override_settings(ROOT_URLCONF='config.urls'):
+            expected = self.client.get('/api/tasks/', params)
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(response.json()['results'][0]['categories'], [self.category.pk])
+
+    def test_overdue_matches_sync_path(self):
+        Task.objects.filter(pk=self.task.pk).update(due_date=timezone.now() - timedelta(hours=1))
+        params = {'telegram_user_id': USER_ID}
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/tasks/overdue/', params)
+        with override_settings(ROOT_URLCONF='config.urls'):
+            expected = self.client.get('/api/tasks/overdue/', params)
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual([task['id'] for task in response.json()['results']], [self.task.pk])
+        self.assertEqual(self.client.get('/api/tasks/overdue/').status_code, 400)
+
+    def test_unsupported_params_fall_back_to_sync(self):
+        # фильтр по категориям валидируется запросом в базу — в async-пути это была бы ошибка
+        response = self.client.get('/api/tasks/', {'telegram_user_id': USER_ID, 'categories': self.category.pk})
+        self.assertEqual(len(response.json()['results']), 3)
+
+    def test_retrieve(self):
+        response = self.client.get(f'/api/tasks/{self.task.pk}/')
+        self.assertEqual(response.json()['categories'][0]['name'], 'Работа')
+        self.assertEqual(self.client.get('/api/tasks/нет/').status_code, 404)
+
+    def test_create(self):
+        response = self.client.post('/api/tasks/', {
+            'title': 'Новая', 'telegram_user_id': USER_ID, 'category_ids': [self.category.pk],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['categories'][0]['id'], self.category.pk)
+        self.assertTrue(Task.objects.filter(pk=response.json()['id'], categories=self.category).exists())
+
+        response = self.client.post('/api/tasks/', {'title': 'Без пользователя'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('telegram_user_id', response.json())
+
+    def test_other_methods_use_sync_view(self):
+        response = self.client.patch(f'/api/tasks/{self.task.pk}/', {'title': 'Другая'}, format='json')
+        self.assertEqual(response.json()['title'], 'Другая')
+
+
+class ConnectionPoolTests(APITestCase):
+    def test_health_reports_pool_stats(self):
+        data = self.client.get('/api/health/').json()
+        if connection.pool is None:
+            self.assertIsNone(data['db_pool'])
+        else:
+            self.assertEqual(data['db_pool']['pool_max'], settings.DATABASES['default']['OPTIONS']['pool']['max_size'])
+
+
+class MetricsTests(APITestCase):
+    def test_request_metrics_by_route(self):
+        Task.objects.create(title='Задача', telegram_user_id=USER_ID)
+        self.client.get(f'/api/tasks/?telegram_user_id={USER_ID}')
+        self.client.get('/no-such-page/')
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('http_request_duration_seconds_count{method="GET",status="200",view="task-list"}', body)
+        self.assertIn('view="unmatched"', body)
+        self.assertIn('http_request_db_queries_count{method="GET",view="task-list"}', body)
+        self.assertIn('serializer_duration_seconds_count{serializer="TaskReadSerializer[]"}', body)
+
+    async def test_db_metrics_under_asgi(self):
+        # под ASGI ORM работает в потоке sync_to_async, а не в потоке event loop
+        labels = {'view': 'task-list', 'method': 'GET'}
+        before = REGISTRY.get_sample_value('http_request_db_queries_sum', labels) or 0
+        await Task.objects.acreate(title='Задача', telegram_user_id=USER_ID)
+        response = await AsyncClient().get('/api/tasks/', {'telegram_user_id': USER_ID})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(REGISTRY.get_sample_value('http_request_db_queries_sum', labels), before)
+        self.assertGreater(REGISTRY.get_sample_value('http_request_db_seconds_sum', labels), 0)
+
+
+class FastJSONTests(unittest.TestCase):
+    data = {
+        'text': 'Купить молоко\u2028', 'when': timezone.now(), 'day': timezone.now().date(),
+        'price': Decimal('12.50'), 'lazy': gettext_lazy('Задача'), 'big': 2 ** 70, 1: [None, True, 1.5],
+    }
+
+    def test_renderer_matches_drf(self):
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        with mock.patch('tasks.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(FastJSONRenderer().render(self.data, 'application/json; indent=4'),
+                         JSONRenderer().render(self.data, 'application/json; indent=4'))
+
+    def test_parser(self):
+        body = '{"title": "Задача", "ids": [1, 2]}'.encode()
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), {'title': 'Задача', 'ids': [1, 2]})
+        self.assertEqual(FastJSONParser().parse(io.BytesIO('"Задача"'.encode('cp1251')), parser_context={'encoding': 'cp1251'}),
+                         'Задача')
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(b'{"id": 123456789012345678901234567890}')),
+                         {'id': 123456789012345678901234567890})
+        for broken in (b'{"title": ', b'NaN', b'\xff'):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(broken))
+
+
+class AdminTests(APITestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        self.categories = [Category.objects.create(name=f'Категория {i}') for i in range(3)]
+        for i in range(5):
+            task = Task.objects.create(title=f'Задача {i}', telegram_user_id=USER_ID)
+            task.categories.set(self.categories[:i % 3 + 1])
+
+    def test_category_counts_in_one_query(self):
+        self.assertEqual(Category.objects.get(name='Категория 0').tasks.count(), 5)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/tasks/category/')
+        self.assertEqual(response.status_code, 200)
+        # счётчики — подзапрос в запросе страницы; COUNT(*) пагинатора таблицу связей не трогает
+        self.assertEqual(sum('tasks_task_categories' in query['sql'] for query in queries), 1)
+        category = Category.objects.get(name='Категория 0')
+        self.assertContains(response, f'<a href="/admin/tasks/task/?categories__id__exact={category.pk}">5</a>',
+                            html=True)
+
+    def test_task_changelist_filters_by_category_without_listing_them(self):
+        category = self.categories[2]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/tasks/task/', {'categories__id__exact': category.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), 1)
+        # категории читаются только для строк страницы, а не весь справочник для фильтра
+        self.assertFalse(any('FROM "tasks_category"' in query['sql'] and 'IN (' not in query['sql']
+                             for query in queries))
+
+    def test_task_changelist_uses_estimate(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Task._meta.db_table}')
+        with mock.patch('tasks.admin.ESTIMATE_THRESHOLD', 0), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/tasks/task/')
+            filtered = self.client.get('/admin/tasks/task/', {'completed__exact': '0'})
+        self.assertEqual((response.status_code, filtered.status_code), (200, 200))
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertIn('pg_class', sql)
+        self.assertIn('EXPLAIN', sql)
+        self.assertNotIn('COUNT(*)', sql)
+
+
+class TimeSortableIdGeneratorTests(unittest.TestCase):
+    def test_monotonic_and_unique_within_batch(self):
+        generator = TimeSortableIdGenerator(20)
+        ids = generator.allocate(5000) + [generator.next_id() for _ in range(100)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertTrue(all(len(task_id) == 20 for task_id in ids))
+
+    def test_sorts_after_legacy_hex_ids(self):
+        self.assertGreater(TimeSortableIdGenerator(16).next_id(), 'f' * 16)
+
+    def test_counter_overflow_and_clock_going_back(self):
+        now = [1_700_000_000_000 * 1_000_000]
+        generator = TimeSortableIdGenerator(16, clock=lambda: now[0])
+        first = generator.allocate(generator.counter_limit + 10)
+        now[0] -= 5_000_000_000  # часы ушли на 5 секунд назад
+        second = generator.allocate(10)
+        ids = first + second
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+
+
+class ModelIdTests(APITestCase):
+    def test_models_use_generator(self):
+        category = Category.objects.create(name='Тест')
+        first = Task.objects.create(title='Первая', telegram_user_id=USER_ID)
+        second = Task.objects.create(title='Вторая', telegram_user_id=USER_ID)
+        self.assertEqual((len(category.id), len(first.id)), (16, 20))
+        self.assertLess(first.id, second.id)
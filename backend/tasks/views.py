@@ -1,14 +1,107 @@
-from rest_framework import viewsets, filters, permissions, status
+import hashlib
+from functools import cached_property
+
+from rest_framework import viewsets, filters, permissions, serializers, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, NotFound
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
+from django.db.models import Count, Max, Prefetch, aprefetch_related_objects
+from django.shortcuts import aget_object_or_404
 from django.utils import timezone
-from .models import Task, Category
-from .serializers import TaskSerializer, CategorySerializer
+from django.utils.cache import parse_etags, quote_etag
+from . import scheduler
+from .async_views import AsyncActionsMixin
+from .models import Task, TaskListVersion, Category
+from .pagination import OverduePagination, TaskCursorPagination
+from .search import TaskSearchFilter
+from .serializers import (
+    EXPANDABLE_FIELDS, TASK_READ_FIELDS, CategorySerializer, TaskBulkItemSerializer, TaskReadSerializer,
+    TaskSerializer,
+)
+from .stats import task_stats
+
+# ограничения bulk-загрузки: задач в одном запросе и строк в одном INSERT
+BULK_MAX_ITEMS = 10000
+BULK_BATCH_SIZE = 1000
+# параметры списка, которые async-путь обрабатывает сам; поиск, сортировка,
+# ?page= и фильтр по категориям идут синхронным путём
+ASYNC_LIST_PARAMS = {'telegram_user_id', 'completed', 'cursor', 'page_size', 'count', 'fields', 'expand'}
+# параметры просроченных задач для async-пути
+ASYNC_OVERDUE_PARAMS = {'telegram_user_id', 'cursor', 'page_size', 'count', 'fields', 'expand'}
+# действия, которые отдаёт TaskReadSerializer и понимают ?fields= / ?expand=
+READ_ACTIONS = ('list', 'retrieve', 'overdue')
+
+
+def task_etag(task):
+    """Версия одной задачи для ETag и If-Match: меняется вместе с updated_at"""
+    return quote_etag(hashlib.sha1(f"{task.pk}|{task.updated_at.isoformat()}".encode()).hexdigest())
+
+
+def bulk_item_id(item):
+    """
+    id элемента bulk: None — новая задача, целое приводится к строке (id задач — строки).
+    Всё остальное (список, объект, bool) — ValueError, а не TypeError в in_bulk.
+    """
+    pk = item.get('id')
+    if pk is None or pk == '':
+        return None
+    if isinstance(pk, int) and not isinstance(pk, bool):
+        return str(pk)
+    if not isinstance(pk, str):
+        raise ValueError(pk)
+    return pk
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'Задача изменилась с момента чтения, загрузите её заново.'
+    default_code = 'precondition_failed'
+
+
+def category_list_version():
+    return Category.objects.aggregate(count=Count('id'), last=Max('updated_at'))
+
+
+async def acategory_list_version():
+    return await Category.objects.aaggregate(count=Count('id'), last=Max('updated_at'))
+
+
+class ConditionalListMixin:
+    """
+    Строгий ETag для list. Версию данных берём из get_list_version (счётчик или агрегат),
+    и если клиент прислал тот же If-None-Match — отвечаем 304, не выбирая и не сериализуя строки.
+    """
+
+    def get_list_version(self):
+        raise NotImplementedError
+
+    def get_list_etag(self, request, version):
+        raw = f"{request.get_full_path()}|{version}"
+        return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+    def not_modified(self, request, etag):
+        """304, если у клиента та же версия списка, иначе None"""
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return None
+
+    def list(self, request, *args, **kwargs):
+        etag = self.get_list_etag(request, self.get_list_version())
+        response = self.not_modified(request, etag)
+        if response is not None:
+            return response
+
+        response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
 
 
 # CRUD благодаря ViewSet
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalListMixin, viewsets.ModelViewSet):
     # объединяем логику для категорий
     queryset = Category.objects.all()  # работаем со всеми категориями.
     serializer_class = CategorySerializer  # используем созданный сериализатор.
@@ -18,21 +111,41 @@ class CategoryViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
 
+    def get_list_version(self):
+        return category_list_version()
+
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(AsyncActionsMixin, ConditionalListMixin, viewsets.ModelViewSet):
     serializer_class = TaskSerializer
+    async_actions = ('list', 'retrieve', 'create', 'overdue')
     permission_classes = [permissions.AllowAny]
+    pagination_class = TaskCursorPagination  # курсор вместо OFFSET, ?page=N тоже работает
     # фильтрация
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter,
-                       filters.OrderingFilter]  # список классов для фильтрации, поиска и сортировки.
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter,
+                       TaskSearchFilter]  # список классов для фильтрации, сортировки и поиска.
     filterset_fields = ['completed', 'categories']  # поля фильтрации
-    search_fields = ['title', 'description']  # поля текстового поиска
+    # текстовый поиск — полнотекстовый по title и description, см. search.py
     ordering_fields = ['created_at', 'due_date', 'completed']  # поля сортировки
     ordering = ['-created_at']
 
     # для аутентификации
     def get_queryset(self):
-        queryset = Task.objects.all()
+        queryset = Task.objects.defer('search_vector')
+        fields, expand = self.read_fields if self.action in READ_ACTIONS else (None, ())
+        if fields is not None:
+            # только запрошенные колонки и поля курсора пагинации
+            columns = self.get_cursor_fields() | set(fields) - {'categories'}
+            if self.action == 'retrieve':
+                columns.add('updated_at')  # для ETag
+            queryset = queryset.only(*columns)
+        if fields is None or 'categories' in expand:
+            # категории одним запросом на страницу, а не по запросу на задачу
+            queryset = queryset.prefetch_related('categories')
+        elif 'categories' in fields:
+            queryset = queryset.prefetch_related(Prefetch('categories', queryset=Category.objects.only('id')))
+        if self.action in ('update', 'partial_update'):
+            # строка блокируется до конца записи (см. update)
+            queryset = queryset.select_for_update(of=('self',))
         telegram_user_id = self.request.query_params.get('telegram_user_id')
 
         if telegram_user_id:
@@ -44,25 +157,297 @@ class TaskViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    def get_cursor_fields(self):
+        pagination = OverduePagination if self.action == 'overdue' else self.pagination_class
+        return {name.lstrip('-') for name in pagination.ordering}
+
+    def get_overdue_queryset(self):
+        """Незавершённые задачи пользователя со сроком в прошлом — по индексу task_user_open_due_idx"""
+        try:
+            user_id = int(self.request.query_params['telegram_user_id'])
+        except (KeyError, ValueError):
+            raise serializers.ValidationError({'telegram_user_id': ['Обязательный параметр, целое число']})
+        return self.get_queryset().filter(telegram_user_id=user_id, completed=False, due_date__lt=timezone.now())
+
+    @cached_property
+    def read_fields(self):
+        """
+        (fields, expand) из ?fields=id,title&expand=categories;
+        fields=None — все поля, как в TaskSerializer
+        """
+        params = self.request.query_params
+        expand = [name for name in params.get('expand', '').split(',') if name]
+        unknown = set(expand) - set(EXPANDABLE_FIELDS)
+        if unknown:
+            raise serializers.ValidationError({'expand': [f"Нельзя раскрыть: {', '.join(sorted(unknown))}"]})
+        if 'fields' not in params:
+            return None, ()
+
+        fields = [name for name in params['fields'].split(',') if name]
+        unknown = set(fields) - set(TASK_READ_FIELDS)
+        if unknown or not fields:
+            raise serializers.ValidationError({'fields': [f"Неизвестные поля: {', '.join(sorted(unknown)) or '—'}"]})
+        # раскрытое поле попадает в ответ и без упоминания в fields
+        fields.extend(name for name in expand if name not in fields)
+        return list(dict.fromkeys(fields)), tuple(expand)
+
+    def get_serializer_class(self):
+        if self.action in READ_ACTIONS:
+            return TaskReadSerializer
+        return super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in READ_ACTIONS:
+            kwargs['fields'], kwargs['expand'] = self.read_fields
+        return super().get_serializer(*args, **kwargs)
+
+    def list_user_id(self):
+        try:
+            return int(self.request.query_params['telegram_user_id'])
+        except (KeyError, ValueError):
+            return None
+
+    def get_list_version(self):
+        # в задачах вложены категории — их переименование тоже меняет ответ
+        user_id = self.list_user_id()
+        if user_id is None:
+            # общий список без пользователя — агрегатом по всей таблице
+            tasks = self.get_queryset().order_by().aggregate(count=Count('id'), last=Max('updated_at'))
+        else:
+            tasks = TaskListVersion.objects.filter(pk=user_id).values_list('version', flat=True).first()
+        return tasks, category_list_version()
+
+    async def aget_list_version(self):
+        user_id = self.list_user_id()
+        if user_id is None:
+            tasks = await self.get_queryset().order_by().aaggregate(count=Count('id'), last=Max('updated_at'))
+        else:
+            tasks = await TaskListVersion.objects.filter(pk=user_id).values_list('version', flat=True).afirst()
+        return tasks, await acategory_list_version()
+
+    def async_supported(self, request, action):
+        if not super().async_supported(request, action):
+            return False
+        if action == 'list':
+            return set(request.GET) <= ASYNC_LIST_PARAMS
+        if action == 'retrieve':
+            return set(request.GET) <= {'telegram_user_id', 'fields', 'expand'}
+        if action == 'overdue':
+            return set(request.GET) <= ASYNC_OVERDUE_PARAMS
+        return True
+
+    async def alist(self, request, *args, **kwargs):
+        etag = self.get_list_etag(request, await self.aget_list_version())
+        response = self.not_modified(request, etag)
+        if response is not None:
+            return response
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        response['ETag'] = etag
+        return response
+
+    async def aretrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        instance = await aget_object_or_404(
+            self.filter_queryset(self.get_queryset()), **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        self.check_object_permissions(request, instance)
+        return Response(self.get_serializer(instance).data, headers={'ETag': task_etag(instance)})
+
+    async def acreate(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        # category_ids проверяются запросами в базу — валидацию целиком отдаём в поток
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        serializer.instance = await serializer.acreate(dict(serializer.validated_data))
+        # ответ содержит категории: подгружаем их здесь, а не синхронно при сериализации
+        await aprefetch_related_objects([serializer.instance], 'categories')
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    async def aoverdue(self, request, *args, **kwargs):
+        paginator = OverduePagination()
+        page = await paginator.apaginate_queryset(self.get_overdue_queryset(), request, view=self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return Response(self.get_serializer(instance).data, headers={'ETag': task_etag(instance)})
+
+    def update(self, request, *args, **kwargs):
+        """
+        PUT и PATCH. Строка читается целиком под select_for_update, и с ней же сравниваются
+        If-Match и тело запроса: между чтением и записью никто не вклинится, а «не изменилось»
+        считается от текущей версии, а не от копии, прочитанной до блокировки.
+        С If-Match запись проходит, только если задача не менялась с момента чтения клиентом.
+        """
+        partial = kwargs.pop('partial', False)
+        if_match = parse_etags(request.headers.get('If-Match', ''))
+        with transaction.atomic():
+            instance = self.get_object()
+            if if_match and '*' not in if_match and task_etag(instance) not in if_match:
+                raise PreconditionFailed()
+            serializer = self.get_serializer(instance, data=request.data, partial=partial)
+            serializer.is_valid(raise_exception=True)
+            self.perform_update(serializer)
+        # кэш prefetch категорий сбрасывает сам update, если они поменялись
+        return Response(serializer.data, headers={'ETag': task_etag(instance)})
+
+    def perform_destroy(self, instance):
+        task_id = instance.pk
+        instance.delete()
+        scheduler.unschedule(task_id)
+
+    @action(detail=True, methods=['post'])
+    def toggle_complete(self, request, pk=None):
+        """
+        Переключить статус одним UPDATE ... RETURNING: без чтения строки перед записью,
+        два одновременных нажатия дают два переключения, а не одно потерянное
+        """
+        table = Task._meta.db_table
+        sql = f'UPDATE {table} SET completed = NOT completed, updated_at = %s WHERE id = %s'
+        params = [timezone.now(), pk]
+        telegram_user_id = request.query_params.get('telegram_user_id')
+        if telegram_user_id:
+            try:
+                params.append(int(telegram_user_id))
+                sql += ' AND telegram_user_id = %s'
+            except ValueError:
+                pass
+        with connection.cursor() as cursor:
+            cursor.execute(f'{sql} RETURNING completed, due_date', params)
+            row = cursor.fetchone()
+        if row is None:
+            raise NotFound()
+
+        completed, due_date = row
+        scheduler.sync_task(Task(id=pk, completed=completed, due_date=due_date))
+        return Response({'id': pk, 'completed': completed})
+
+    @action(detail=False, methods=['get'])
+    def overdue(self, request):
+        """Просроченные задачи пользователя, курсорная пагинация по (due_date, id)"""
+        paginator = OverduePagination()
+        page = paginator.paginate_queryset(self.get_overdue_queryset(), request, view=self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Всего, выполнено, в работе, просрочено — в целом и по категориям, одним запросом"""
+        try:
+            user_id = int(request.query_params['telegram_user_id'])
+        except (KeyError, ValueError):
+            return Response({'telegram_user_id': ['Обязательный параметр, целое число']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(task_stats(user_id, timezone.now()))
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Пачка задач одним запросом: элементы без id создаются, с id — частично обновляются.
+        Валидные элементы пишутся bulk_create/bulk_update и одной вставкой связей
+        с категориями в одной транзакции, ошибки возвращаются по индексу элемента.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response({'detail': 'Ожидается список задач'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > BULK_MAX_ITEMS:
+            return Response({'detail': f'Не больше {BULK_MAX_ITEMS} задач за запрос'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # всё, на что ссылается пачка, загружаем двумя запросами заранее
+        objects = [item for item in items if isinstance(item, dict)]
+        referenced = {
+            str(pk) for item in objects if isinstance(item.get('category_ids'), list)
+            for pk in item['category_ids']
+        }
+        context = {
+            **self.get_serializer_context(),
+            'category_ids': set(Category.objects.filter(pk__in=referenced).order_by().values_list('id', flat=True)),
+        }
+        # id элементов по индексу; элемента с негодным id здесь нет
+        pks = {}
+        for index, item in enumerate(items):
+            if isinstance(item, dict):
+                try:
+                    pks[index] = bulk_item_id(item)
+                except ValueError:
+                    pass
+        existing = Task.objects.in_bulk([pk for pk in pks.values() if pk is not None])
+        # поля ModelSerializer строятся дорого — один экземпляр на режим, а не на элемент
+        creator = TaskBulkItemSerializer(context=context)
+        updater = TaskBulkItemSerializer(context=context, partial=True)
+        # id для новых задач одной пачкой; за невалидные элементы номера просто пропадут
+        new_ids = iter(Task.allocate_ids(sum(1 for pk in pks.values() if pk is None)))
+
+        results = []
+        to_create = []
+        to_update = {}
+        update_fields = set()
+        links = {}
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results.append({'index': index, 'errors': {'non_field_errors': ['Ожидается объект задачи']}})
+                continue
+
+            if index not in pks:
+                results.append({'index': index, 'errors': {'id': ['Ожидается строка с id задачи']}})
+                continue
+            instance = None
+            if pks[index] is not None:
+                instance = existing.get(pks[index])
+                if instance is None:
+                    results.append({'index': index, 'errors': {'id': ['Задача не найдена']}})
+                    continue
+
+            try:
+                data = dict((creator if instance is None else updater).run_validation(item))
+            except serializers.ValidationError as exc:
+                results.append({'index': index, 'errors': exc.detail})
+                continue
+
+            category_ids = data.pop('category_ids', None)
+            if instance is None:
+                task = Task(**data)
+                task.id = next(new_ids)
+                to_create.append(task)
+            else:
+                task = instance
+                for attr, value in data.items():
+                    setattr(task, attr, value)
+                update_fields.update(data)
+                to_update[task.pk] = task
+            if category_ids is not None:
+                links[task.pk] = category_ids
+            results.append({'index': index, 'id': task.pk})
 
-# Возвращает JSON с новым статусом (упрощаем работу)
-@action(detail=True, methods=['post'])
-def toggle_complete(self, request, pk=None):
-    task = self.get_object()
-    task.completed = not task.completed
-    task.save()
-    return Response({'completed': task.completed})
+        Through = Task.categories.through
+        with transaction.atomic():
+            Task.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+            if to_update:
+                # bulk_update не трогает auto_now — выставляем сами, иначе ETag не сменится
+                now = timezone.now()
+                for task in to_update.values():
+                    task.updated_at = now
+                Task.objects.bulk_update(to_update.values(), sorted(update_fields | {'updated_at'}),
+                                         batch_size=BULK_BATCH_SIZE)
+                Through.objects.filter(task_id__in=[pk for pk in links if pk in to_update]).delete()
+            Through.objects.bulk_create(
+                [Through(task_id=task_id, category_id=category_id)
+                 for task_id, category_ids in links.items() for category_id in category_ids],
+                batch_size=BULK_BATCH_SIZE
+            )
 
+        scheduler.sync_tasks([*to_create, *to_update.values()])
 
-# получения списка всех просроченных задач
-@action(detail=False, methods=['get'])
-def overdue(self, request):
-    queryset = self.get_queryset().filter(due_date__lt=timezone.now(), completed=False)
-    page = self.paginate_queryset(queryset)
-    # для красоты
-    if page is not None:
-        serializer = self.get_serializer(page, many=True)
-        return self.get_paginated_response(serializer.data)
+        saved = sum('id' in result for result in results)
+        if saved == 0 and items:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif saved < len(items):
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({'created': len(to_create), 'updated': len(to_update), 'results': results},
+                        status=response_status)
 
-    serializer = self.get_serializer(queryset, many=True)
-    return Response(serializer.data)
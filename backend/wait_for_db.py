@@ -1,7 +1,7 @@
 import os
 import sys
 import time
-import psycopg2
+import psycopg
 from django.db import connections
 from django.db.utils import OperationalError
 
@@ -14,7 +14,7 @@ def wait_for_db():
     # попытки подключения, обработка
     for i in range(max_retries):
         try:
-            conn = psycopg2.connect(
+            conn = psycopg.connect(
                 dbname=os.environ.get('POSTGRES_DB'),
                 user=os.environ.get('POSTGRES_USER'),
                 password=os.environ.get('POSTGRES_PASSWORD'),
@@ -0,0 +1,293 @@
+"""
+Нагрузочный стенд бота: синтетические Update подаются прямо в Dispatcher из main.py.
+
+Исходящие вызовы Telegram перехватывает FakeSession (запросы сериализуются
+как настоящие, но никуда не уходят), Django API заменён локальной заглушкой
+с настраиваемой задержкой. Каждый пользователь проходит сценарии по очереди
+(как Telegram доставляет апдейты одного чата), пользователи — параллельно.
+
+Пример:
+    python bench.py --users 200 --rounds 5 --api-latency 0.02
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import statistics
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import InlineKeyboardMarkup, Message, Update
+
+logger = logging.getLogger(__name__)
+
+BOT_ID = 1
+# сценарии: команды, нажатия кнопок по тексту и ввод текста
+FLOWS = {
+    'tasks': [('text', '/tasks'), ('click', '▶️'), ('click', '◀️')],
+    'menu': [('text', '/menu'), ('click', '📝 Мои задачи'), ('click', '🔙 Назад'), ('click', '❌ Закрыть')],
+    'add': [('text', '/add'), ('text', 'Купить молоко'), ('text', 'Два литра'), ('text', '2030-01-01 10:00')],
+    'help': [('text', '/help')],
+}
+
+
+class FakeSession(BaseSession):
+    """Сессия без сети: считает вызовы API Telegram и отвечает правдоподобными объектами"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self.bytes_sent = 0
+        self.message_ids = itertools.count(1)
+        # последнее сообщение с inline-клавиатурой в каждом чате — по нему "нажимаем" кнопки
+        self.keyboards: Dict[int, Message] = {}
+
+    async def make_request(self, bot: Bot, method, timeout: Optional[int] = None) -> Any:
+        self.calls[type(method).__name__] += 1
+        # та же подготовка запроса, что в AiohttpSession, чтобы сериализация попала в замер
+        payload = {
+            key: self.prepare_value(value, bot=bot, files={})
+            for key, value in method.model_dump(warnings=False).items()
+            if value is not None
+        }
+        self.bytes_sent += len(json.dumps(payload, ensure_ascii=False).encode())
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method.__returning__ is bool:
+            return True
+
+        chat_id = getattr(method, 'chat_id', None) or 0
+        markup = getattr(method, 'reply_markup', None)
+        message = Message.model_validate({
+            'message_id': getattr(method, 'message_id', None) or next(self.message_ids),
+            'date': datetime.now(timezone.utc),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': BOT_ID, 'is_bot': True, 'first_name': 'bench'},
+            'text': getattr(method, 'text', None),
+            'reply_markup': markup.model_dump() if isinstance(markup, InlineKeyboardMarkup) else None,
+        }, context={'bot': bot})
+        if message.reply_markup is not None:
+            self.keyboards[chat_id] = message
+        return message
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        raise NotImplementedError
+        yield b''
+
+
+class StubAPI:
+    """Заглушка Django API в памяти: те же URL и форма ответов, плюс задержка"""
+
+    def __init__(self, latency: float, tasks_per_user: int):
+        self.latency = latency
+        self.tasks_per_user = tasks_per_user
+        self.tasks: Dict[int, list] = {}
+        self.ids = itertools.count(1)
+        self.calls = Counter()
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/api/health/', self.health)
+        app.router.add_get('/api/tasks/', self.list_tasks)
+        app.router.add_post('/api/tasks/', self.create_task)
+        app.router.add_get('/api/tasks/stats/', self.task_stats)
+        app.router.add_get('/api/categories/', self.list_categories)
+        return app
+
+    async def respond(self, name: str, data: Any, status: int = 200) -> web.Response:
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response(data, status=status, dumps=lambda obj: json.dumps(obj, ensure_ascii=False))
+
+    def make_task(self, user_id: int, title: str, description: str = '', due_date: Optional[str] = None):
+        now = datetime.now(timezone.utc)
+        return {
+            'id': f'{next(self.ids):020d}', 'title': title, 'description': description,
+            'created_at': now.isoformat(), 'due_date': due_date, 'completed': False,
+            'telegram_user_id': user_id, 'categories': [],
+        }
+
+    def user_tasks(self, user_id: int) -> list:
+        if user_id not in self.tasks:
+            due = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+            self.tasks[user_id] = [
+                self.make_task(user_id, f'Задача {i}', description='Описание задачи' * (i % 3), due_date=due)
+                for i in range(self.tasks_per_user)
+            ]
+        return self.tasks[user_id]
+
+    async def health(self, request: web.Request) -> web.Response:
+        return await self.respond('health', {'status': 'healthy'})
+
+    async def list_tasks(self, request: web.Request) -> web.Response:
+        tasks = self.user_tasks(int(request.query['telegram_user_id']))
+        # курсор заглушки — просто смещение
+        offset = int(request.query.get('cursor', 0))
+        page_size = int(request.query.get('page_size', 20))
+        following = request.url.update_query(cursor=offset + page_size)
+        return await self.respond('list_tasks', {
+            'next': str(following) if offset + page_size < len(tasks) else None,
+            'previous': None,
+            'results': tasks[offset:offset + page_size],
+        })
+
+    async def task_stats(self, request: web.Request) -> web.Response:
+        tasks = self.user_tasks(int(request.query['telegram_user_id']))
+        completed = sum(task['completed'] for task in tasks)
+        return await self.respond('task_stats', {
+            'total': len(tasks), 'completed': completed, 'pending': len(tasks) - completed,
+            'overdue': 0, 'uncategorized': len(tasks), 'categories': [],
+        })
+
+    async def create_task(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        task = self.make_task(data['telegram_user_id'], data['title'],
+                              description=data.get('description', ''), due_date=data.get('due_date'))
+        self.user_tasks(task['telegram_user_id']).insert(0, task)
+        return await self.respond('create_task', task, status=201)
+
+    async def list_categories(self, request: web.Request) -> web.Response:
+        return await self.respond('list_categories', {'count': 0, 'next': None, 'previous': None, 'results': []})
+
+
+class Harness:
+    def __init__(self, dp, bot: Bot, session: FakeSession):
+        self.dp = dp
+        self.bot = bot
+        self.session = session
+        self.update_ids = itertools.count(1)
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+
+    def message_update(self, user_id: int, text: str) -> Update:
+        return Update.model_validate({
+            'update_id': next(self.update_ids),
+            'message': {
+                'message_id': next(self.session.message_ids),
+                'date': datetime.now(timezone.utc),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+                'text': text,
+            },
+        }, context={'bot': self.bot})
+
+    def callback_update(self, user_id: int, button_text: str) -> Optional[Update]:
+        message = self.session.keyboards.get(user_id)
+        if message is None:
+            return None
+        for row in message.reply_markup.inline_keyboard:
+            for button in row:
+                if button.text == button_text:
+                    return Update.model_validate({
+                        'update_id': next(self.update_ids),
+                        'callback_query': {
+                            'id': str(next(self.update_ids)),
+                            'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+                            'chat_instance': str(user_id),
+                            'message': message.model_dump(),
+                            'data': button.callback_data,
+                        },
+                    }, context={'bot': self.bot})
+        return None
+
+    async def run_user(self, user_id: int, flows, rounds: int):
+        for _ in range(rounds):
+            for flow in flows:
+                for kind, value in FLOWS[flow]:
+                    label = f'{flow}: {value}'
+                    if kind == 'text':
+                        update = self.message_update(user_id, value)
+                    else:
+                        update = self.callback_update(user_id, value)
+                    if update is None:
+                        self.errors[f'{label} (нет кнопки)'] += 1
+                        break
+
+                    started = time.perf_counter()
+                    try:
+                        await self.dp.feed_update(self.bot, update)
+                    except Exception as e:
+                        self.errors[f'{label} ({type(e).__name__})'] += 1
+                        logger.debug(f"Ошибка в {label}: {e}")
+                        break
+                    self.latencies[label].append(time.perf_counter() - started)
+
+
+def percentile_ms(values, q):
+    if len(values) < 2:
+        return values[0] * 1000 if values else 0.0
+    return statistics.quantiles(values, n=100)[q - 1] * 1000
+
+
+async def run(args):
+    stub = StubAPI(args.api_latency, args.tasks_per_user)
+    runner = web.AppRunner(stub.make_app())
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', args.api_port)
+    await site.start()
+
+    # main.py читает настройки при импорте
+    os.environ['BOT_TOKEN'] = '123456:bench-token'
+    os.environ['API_URL'] = f'http://127.0.0.1:{args.api_port}/api'
+    os.environ['API_CACHE_TTL'] = str(args.cache_ttl)
+    import main
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    session = FakeSession(args.telegram_latency)
+    bot = Bot(token=os.environ['BOT_TOKEN'], session=session)
+    main.setup_dispatcher()
+    await main.dp.emit_startup(bot=bot, dispatcher=main.dp, **main.dp.workflow_data)
+
+    harness = Harness(main.dp, bot, session)
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            harness.run_user(user_id, args.flow or list(FLOWS), args.rounds)
+            for user_id in range(1000, 1000 + args.users)
+        ))
+        elapsed = time.perf_counter() - started
+    finally:
+        await main.dp.emit_shutdown(bot=bot, dispatcher=main.dp, **main.dp.workflow_data)
+        await runner.cleanup()
+
+    total = sum(len(values) for values in harness.latencies.values())
+    print(f"{'шаг':<34}{'апдейтов':>9}{'p50 мс':>9}{'p95 мс':>9}{'p99 мс':>9}")
+    for label, values in harness.latencies.items():
+        print(f"{label:<34}{len(values):>9}{percentile_ms(values, 50):>9.1f}"
+              f"{percentile_ms(values, 95):>9.1f}{percentile_ms(values, 99):>9.1f}")
+    print(f"\nВсего: {total} апдейтов за {elapsed:.2f} с — {total / elapsed:,.0f} апдейтов/с")
+    print(f"Вызовы Telegram: {dict(session.calls)}, отправлено {session.bytes_sent / 1024:.0f} КБ")
+    print(f"Вызовы API: {dict(stub.calls)}")
+    if harness.errors:
+        print(f"Ошибки: {dict(harness.errors)}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Пропускная способность бота на синтетических апдейтах')
+    parser.add_argument('--users', type=int, default=100, help='одновременных пользователей')
+    parser.add_argument('--rounds', type=int, default=3, help='сколько раз каждый проходит сценарии')
+    parser.add_argument('--flow', choices=sorted(FLOWS), action='append', help='сценарии (по умолчанию все)')
+    parser.add_argument('--api-latency', type=float, default=0.01, help='задержка ответа заглушки API, с')
+    parser.add_argument('--telegram-latency', type=float, default=0.0, help='задержка вызовов Telegram, с')
+    parser.add_argument('--tasks-per-user', type=int, default=20, help='задач у каждого пользователя в заглушке')
+    parser.add_argument('--cache-ttl', type=float, default=30, help='API_CACHE_TTL бота')
+    parser.add_argument('--api-port', type=int, default=8765)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    asyncio.run(run(parse_args()))
@@ -6,6 +6,7 @@ from aiogram_dialog.widgets.input import TextInput, ManagedTextInput
 from aiogram.types import Message, CallbackQuery
 from datetime import datetime
 from typing import Any
+import asyncio
 import logging
 
 from services.api_client import APIClient
@@ -25,23 +26,23 @@ class TaskDialog(StatesGroup):
 
 async def get_tasks_data(dialog_manager: DialogManager, **kwargs):
     user_id = dialog_manager.event.from_user.id
-    api_url = dialog_manager.middleware_data.get('api_url', 'http://backend:8000/api')
+    api: APIClient = dialog_manager.middleware_data['api']
 
-    async with APIClient(api_url) as client:
-        tasks = await client.get_tasks(user_id)
+    # окну нужен только заголовок
+    tasks, stats = await asyncio.gather(api.get_tasks(user_id, fields='id,title'), api.get_task_stats(user_id))
 
     return {
         'tasks': tasks[:10],  # Ограничиваем 10 задачами
-        'tasks_count': len(tasks),
+        # всего у пользователя, а не на первой странице списка
+        'tasks_count': stats.get('total', len(tasks)),
         'user_id': user_id
     }
 
 
 async def get_categories_data(dialog_manager: DialogManager, **kwargs):
-    api_url = dialog_manager.middleware_data.get('api_url', 'http://backend:8000/api')
+    api: APIClient = dialog_manager.middleware_data['api']
 
-    async with APIClient(api_url) as client:
-        categories = await client.get_categories()
+    categories = await api.get_categories()
 
     return {
         'categories': categories,
@@ -89,7 +90,7 @@ async def on_due_date_entered(message: Message, widget: ManagedTextInput,
             return
 
     user_id = message.from_user.id
-    api_url = dialog_manager.middleware_data.get('api_url', 'http://backend:8000/api')
+    api: APIClient = dialog_manager.middleware_data['api']
 
     task_data = {
         "title": dialog_manager.dialog_data['title'],
@@ -98,8 +99,7 @@ async def on_due_date_entered(message: Message, widget: ManagedTextInput,
         "telegram_user_id": user_id,
     }
 
-    async with APIClient(api_url) as client:
-        result = await client.create_task(task_data)
+    result = await api.create_task(task_data)
 
     if result:
         await message.answer(f"✅ Задача '{task_data['title']}' успешно добавлена!")
@@ -1,10 +1,10 @@
 import asyncio
 import logging
 import os
-from datetime import datetime
 from typing import Optional
 
 from aiogram import Bot, Dispatcher, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
 from aiogram_dialog import DialogManager, StartMode, setup_dialogs
@@ -13,6 +13,7 @@ from dotenv import load_dotenv
 
 from dialogs.task_dialog import task_dialog, TaskDialog
 from services.api_client import APIClient
+from services.task_browser import TaskBrowser, TaskPage
 
 load_dotenv()
 
@@ -24,6 +25,15 @@ logger = logging.getLogger(__name__)
 
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 API_URL = os.getenv('API_URL', 'http://backend:8000/api')
+# пул соединений к Django API, общий на весь процесс бота
+API_POOL_SIZE = int(os.getenv('API_POOL_SIZE', '100'))
+API_POOL_PER_HOST = int(os.getenv('API_POOL_PER_HOST', '0'))
+API_KEEPALIVE_TIMEOUT = float(os.getenv('API_KEEPALIVE_TIMEOUT', '30'))
+# кэш списков задач и категорий в боте; 0 — каждый раз перепроверять по ETag
+API_CACHE_TTL = float(os.getenv('API_CACHE_TTL', '30'))
+API_CACHE_MAX_BYTES = int(os.getenv('API_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+# задач на странице /tasks
+TASKS_PAGE_SIZE = int(os.getenv('TASKS_PAGE_SIZE', '10'))
 
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN не установлен в переменных окружения")
@@ -32,19 +42,18 @@ bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher()
 
 
-async def check_api_health():
+async def check_api_health(api: APIClient):
     """Проверка доступности API"""
     try:
-        async with APIClient(API_URL) as client:
-            result = await client._request('GET', 'health/')
-            return result is not None
+        result = await api._request('GET', 'health/')
+        return result is not None
     except Exception as e:
         logger.error(f"Ошибка проверки API: {e}")
         return False
 
 
 @dp.message(Command("start"))
-async def cmd_start(message: Message, dialog_manager: DialogManager):
+async def cmd_start(message: Message, dialog_manager: DialogManager, api: APIClient):
     await message.answer(
         "👋 *Добро пожаловать в ToDo List бот!*\n\n"
         "Я помогу вам управлять вашими задачами.\n\n"
@@ -59,7 +68,7 @@ async def cmd_start(message: Message, dialog_manager: DialogManager):
     )
 
     # Проверяем доступность API
-    if not await check_api_health():
+    if not await check_api_health(api):
         await message.answer("⚠️ *Внимание:* Сервер задач временно недоступен. Попробуйте позже.",
                              parse_mode="Markdown")
 
@@ -70,56 +79,27 @@ async def cmd_menu(message: Message, dialog_manager: DialogManager):
 
 
 @dp.message(Command("tasks"))
-async def cmd_tasks(message: Message):
-    user_id = message.from_user.id
+async def cmd_tasks(message: Message, task_browser: TaskBrowser):
+    task_browser.start(message.from_user.id)
+    text, markup = await task_browser.render(message.from_user.id, page=0)
+    await message.answer(text, reply_markup=markup, parse_mode="HTML")
 
-    async with APIClient(API_URL) as client:
-        tasks = await client.get_tasks(user_id)
 
-    if not tasks:
-        await message.answer("📭 У вас пока нет задач.\nИспользуйте /add чтобы создать первую.")
+@dp.callback_query(TaskPage.filter())
+async def on_task_page(callback: CallbackQuery, callback_data: TaskPage, task_browser: TaskBrowser):
+    screen = await task_browser.render(callback.from_user.id, callback_data.page, callback_data.part)
+    if screen is None:
+        await callback.answer("Список устарел, откройте /tasks заново", show_alert=True)
         return
 
-    response = "📋 *Ваши задачи:*\n\n"
-
-    for i, task in enumerate(tasks, 1):
-        created_at = task.get('created_at', '')
-        try:
-            dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-            formatted_date = dt.strftime("%d.%m.%Y %H:%M")
-        except:
-            formatted_date = created_at
-
-        status = "✅" if task.get('completed') else "⏳"
-
-        response += f"{i}. {status} *{task['title']}*\n"
-
-        if task.get('description'):
-            desc = task['description'][:50] + "..." if len(task['description']) > 50 else task['description']
-            response += f"   📝 {desc}\n"
-
-        response += f"   📅 Создано: {formatted_date}\n"
-
-        if task.get('due_date'):
-            try:
-                due_dt = datetime.fromisoformat(task['due_date'].replace('Z', '+00:00'))
-                due_date_str = due_dt.strftime('%d.%m.%Y %H:%M')
-                response += f"   ⏰ Срок: {due_date_str}\n"
-            except:
-                pass
-
-        if task.get('categories'):
-            cat_names = [cat['name'] for cat in task['categories']]
-            response += f"   🏷️ Категории: {', '.join(cat_names)}\n"
-
-        response += "\n"
-
-    response += f"📊 *Всего задач: {len(tasks)}*"
-
-    if len(response) > 4000:
-        response = response[:4000] + "\n\n... (сообщение сокращено)"
-
-    await message.answer(response, parse_mode="Markdown")
+    text, markup = screen
+    try:
+        # листаем в том же сообщении, а не присылаем новое
+        await callback.message.edit_text(text, reply_markup=markup, parse_mode="HTML")
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            raise
+    await callback.answer()
 
 
 @dp.message(Command("add"))
@@ -147,8 +127,8 @@ async def cmd_help(message: Message):
 
 
 @dp.message(Command("health"))
-async def cmd_health(message: Message):
-    api_healthy = await check_api_health()
+async def cmd_health(message: Message, api: APIClient):
+    api_healthy = await check_api_health(api)
     status = "✅" if api_healthy else "❌"
 
     response = (
@@ -182,7 +162,20 @@ async def cmd_health(message: Message):
 async def on_startup():
     logger.info("Бот запускается...")
 
-    if await check_api_health():
+    # один клиент на процесс; в хендлеры и геттеры диалогов попадает как `api`
+    api = APIClient(
+        API_URL,
+        pool_size=API_POOL_SIZE,
+        pool_per_host=API_POOL_PER_HOST,
+        keepalive_timeout=API_KEEPALIVE_TIMEOUT,
+        cache_ttl=API_CACHE_TTL,
+        cache_max_bytes=API_CACHE_MAX_BYTES,
+    )
+    await api.start()
+    dp['api'] = api
+    dp['task_browser'] = TaskBrowser(api, page_size=TASKS_PAGE_SIZE)
+
+    if await check_api_health(api):
         logger.info("API доступен")
     else:
         logger.warning("API недоступен")
@@ -191,10 +184,14 @@ async def on_startup():
 async def on_shutdown():
     logger.info("Бот останавливается...")
 
+    dp.workflow_data.pop('task_browser', None)
+    api = dp.workflow_data.pop('api', None)
+    if api:
+        await api.close()
 
-async def main():
-    logger.info("Запуск бота...")
 
+def setup_dispatcher():
+    """Хуки и диалоги; отдельно от main(), чтобы bench.py собирал тот же диспетчер"""
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
 
@@ -202,6 +199,10 @@ async def main():
     dp.include_router(task_dialog)
     setup_dialogs(dp)
 
+
+async def main():
+    logger.info("Запуск бота...")
+    setup_dispatcher()
     await dp.start_polling(bot)
 
 
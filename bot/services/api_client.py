@@ -1,29 +1,144 @@
 import aiohttp
 import asyncio
+import json
 import logging
-from typing import Optional, List, Dict, Any
+import time
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Hashable, NamedTuple, Tuple
 from datetime import datetime
+from urllib.parse import urlencode
+
+try:
+    import orjson
+except ImportError:  # необязательная зависимость
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# ответы API разбираются orjson, если он установлен; результат тот же, что у json.loads
+json_loads = orjson.loads if orjson else json.loads
+
+
+def json_dumps(obj: Any) -> str:
+    # aiohttp ждёт str; ensure_ascii=False — как orjson, кириллица без \uXXXX
+    if orjson:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False)
+
+
+class APIResponse(NamedTuple):
+    status: int
+    data: Optional[Dict[str, Any]]
+    size: int = 0
+    etag: Optional[str] = None
+
+
+class CacheEntry(NamedTuple):
+    expires_at: float
+    size: int
+    value: Any
+    etag: Optional[str]
+
+
+class ResponseCache:
+    """
+    LRU-кэш ответов API с TTL. Объём ограничен суммарным размером JSON-ответов
+    в байтах: при переполнении выбрасываются давно не читанные записи.
+    Просроченная запись не удаляется сразу — по её ETag запрос перепроверяется (304).
+    """
+
+    def __init__(self, max_bytes: int, ttl: float, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.size = 0
+        self._entries: 'OrderedDict[Hashable, CacheEntry]' = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Свежее значение или None"""
+        entry = self.get_stale(key)
+        if entry is None or entry.expires_at <= self.clock():
+            return None
+        return entry.value
+
+    def get_stale(self, key: Hashable) -> Optional[CacheEntry]:
+        """Запись вместе с ETag, даже если TTL уже истёк"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: Hashable, value: Any, size: int, etag: Optional[str] = None):
+        if self.ttl < 0 or size > self.max_bytes:
+            return
+        self.invalidate(key)
+        self._entries[key] = CacheEntry(self.clock() + self.ttl, size, value, etag)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+
+    def invalidate(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def invalidate_where(self, predicate):
+        for key in [key for key in self._entries if predicate(key)]:
+            self.invalidate(key)
+
 
 class APIClient:
-    def __init__(self, base_url: str, timeout: int = 30):
+    """
+    Клиент Django API. В боте живёт один экземпляр на процесс (создаётся в on_startup),
+    поэтому соединения с backend переиспользуются из пула, а не открываются на каждый запрос.
+    """
+
+    def __init__(self, base_url: str, timeout: int = 30, pool_size: int = 100,
+                 pool_per_host: int = 0, keepalive_timeout: float = 30,
+                 cache_ttl: float = 30, cache_max_bytes: int = 8 * 1024 * 1024):
         self.base_url = base_url.rstrip('/')
         self.timeout = aiohttp.ClientTimeout(total=timeout)
+        # limit — всего соединений, limit_per_host — на один хост (0 — без ограничения)
+        self.pool_size = pool_size
+        self.pool_per_host = pool_per_host
+        self.keepalive_timeout = keepalive_timeout
         self.session: Optional[aiohttp.ClientSession] = None
+        # списки задач по пользователю и общий список категорий; при cache_ttl=0 — только перепроверка по ETag
+        self.cache = ResponseCache(cache_max_bytes, cache_ttl)
 
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(timeout=self.timeout)
+        await self.start()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def start(self):
+        """Открыть сессию с пулом соединений"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self.session = aiohttp.ClientSession(timeout=self.timeout, connector=connector,
+                                                 json_serialize=json_dumps)
+
+    async def close(self):
+        """Закрыть сессию и все соединения пула"""
         if self.session:
             await self.session.close()
+            self.session = None
 
     async def _request(self, method: str, endpoint: str, **kwargs) -> Optional[Dict[str, Any]]:
-        if not self.session:
-            self.session = aiohttp.ClientSession(timeout=self.timeout)
+        response = await self._send(method, endpoint, **kwargs)
+        return response.data
+
+    async def _send(self, method: str, endpoint: str, **kwargs) -> APIResponse:
+        """То же, что _request, плюс статус, размер тела и ETag (для кэша)"""
+        if self.session is None or self.session.closed:
+            await self.start()
 
         url = f"{self.base_url}/{endpoint.lstrip('/')}"
 
@@ -31,53 +146,118 @@ class APIClient:
             try:
                 async with self.session.request(method, url, **kwargs) as response:
                     if response.status == 200 or response.status == 201:
-                        return await response.json()
+                        body = await response.read()
+                        return APIResponse(response.status, json_loads(body), len(body), response.headers.get('ETag'))
+                    elif response.status == 204:
+                        return APIResponse(response.status, {})
+                    elif response.status == 304:
+                        return APIResponse(response.status, None, etag=response.headers.get('ETag'))
+                    elif response.status == 412:
+                        logger.warning(f"Ресурс изменился с момента чтения: {url}")
+                        return APIResponse(response.status, None)
                     elif response.status == 404:
                         logger.warning(f"Ресурс не найден: {url}")
-                        return None
+                        return APIResponse(response.status, None)
                     else:
                         logger.error(f"Ошибка API {response.status}: {await response.text()}")
                         if attempt == 2:  # Последняя попытка
-                            return None
+                            return APIResponse(response.status, None)
                         await asyncio.sleep(1 * (attempt + 1))
             except aiohttp.ClientError as e:
                 logger.error(f"Ошибка подключения к API: {e}")
                 if attempt == 2:
-                    return None
+                    return APIResponse(0, None)
                 await asyncio.sleep(2 * (attempt + 1))
 
-        return None
+        return APIResponse(0, None)
+
+    async def _get_cached(self, key: Hashable, endpoint: str) -> Optional[Dict[str, Any]]:
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
 
-    async def get_tasks(self, user_id: int) -> List[Dict[str, Any]]:
-        """Получить задачи пользователя"""
-        result = await self._request('GET', f'tasks/?telegram_user_id={user_id}')
+        # TTL истёк — спрашиваем с If-None-Match, на 304 берём старое тело
+        stale = self.cache.get_stale(key)
+        headers = {'If-None-Match': stale.etag} if stale and stale.etag else {}
+        response = await self._send('GET', endpoint, headers=headers)
+        if response.status == 304 and stale:
+            self.cache.set(key, stale.value, stale.size, stale.etag)
+            return stale.value
+
+        if response.data is not None:
+            self.cache.set(key, response.data, response.size, response.etag)
+        return response.data
+
+    def invalidate_tasks(self, user_id: Optional[int] = None):
+        """Сбросить кэш задач и счётчиков пользователя; без user_id — всех пользователей"""
+        if user_id is not None:
+            user_id = int(user_id)
+            self.cache.invalidate_where(lambda key: key[0] in ('tasks', 'stats') and key[1] == user_id)
+        else:
+            self.cache.invalidate_where(lambda key: key[0] in ('tasks', 'stats'))
+
+    async def get_tasks(self, user_id: int, fields: Optional[str] = None,
+                        expand: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Получить задачи пользователя; fields/expand — только нужные поля (?fields=id,title)"""
+        result = await self.get_task_page(user_id, fields=fields, expand=expand)
         return result.get('results', []) if result else []
 
+    async def get_task_page(self, user_id: int, cursor: Optional[str] = None, page_size: Optional[int] = None,
+                            fields: Optional[str] = None, expand: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Страница списка задач целиком: results, next, previous; cursor — из ссылки next/previous"""
+        params = {'telegram_user_id': user_id, 'cursor': cursor, 'page_size': page_size,
+                  'fields': fields, 'expand': expand}
+        query = urlencode({key: value for key, value in params.items() if value is not None})
+        # страницы кэшируются как и первый список — invalidate_tasks сбрасывает их все
+        return await self._get_cached(('tasks', int(user_id), fields, expand, cursor, page_size), f'tasks/?{query}')
+
+    async def get_task_stats(self, user_id: int) -> Dict[str, Any]:
+        """Счётчики задач пользователя: total, completed, pending, overdue и по категориям"""
+        result = await self._get_cached(('stats', int(user_id)), f'tasks/stats/?telegram_user_id={user_id}')
+        return result or {}
+
     async def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
         """Получить задачу по ID"""
         return await self._request('GET', f'tasks/{task_id}/')
 
     async def create_task(self, task_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Создать новую задачу"""
-        return await self._request('POST', 'tasks/', json=task_data)
+        result = await self._request('POST', 'tasks/', json=task_data)
+        self.invalidate_tasks(task_data.get('telegram_user_id'))
+        return result
+
+    async def get_task_versioned(self, task_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Задача и её ETag — для update_task(..., etag=...)"""
+        response = await self._send('GET', f'tasks/{task_id}/')
+        return response.data, response.etag
 
-    async def update_task(self, task_id: str, task_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Обновить задачу"""
-        return await self._request('PUT', f'tasks/{task_id}/', json=task_data)
+    async def update_task(self, task_id: str, task_data: Dict[str, Any],
+                          etag: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Обновить задачу: PATCH только с изменёнными полями.
+        С etag запись пройдёт, только если задачу никто не менял с момента чтения (иначе None)
+        """
+        headers = {'If-Match': etag} if etag else {}
+        result = await self._request('PATCH', f'tasks/{task_id}/', json=task_data, headers=headers)
+        self.invalidate_tasks(task_data.get('telegram_user_id') or (result or {}).get('telegram_user_id'))
+        return result
 
-    async def delete_task(self, task_id: str) -> bool:
+    async def delete_task(self, task_id: str, user_id: Optional[int] = None) -> bool:
         """Удалить задачу"""
         result = await self._request('DELETE', f'tasks/{task_id}/')
+        self.invalidate_tasks(user_id)
         return result is not None
 
     async def get_categories(self) -> List[Dict[str, Any]]:
         """Получить список категорий"""
-        result = await self._request('GET', 'categories/')
+        result = await self._get_cached(('categories',), 'categories/')
         return result.get('results', []) if result else []
 
-    async def toggle_task_complete(self, task_id: str) -> Optional[Dict[str, Any]]:
+    async def toggle_task_complete(self, task_id: str, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """Переключить статус выполнения задачи"""
-        return await self._request('POST', f'tasks/{task_id}/toggle_complete/')
+        result = await self._request('POST', f'tasks/{task_id}/toggle_complete/')
+        self.invalidate_tasks(user_id)
+        return result
 
     async def get_overdue_tasks(self, user_id: int) -> List[Dict[str, Any]]:
         """Получить просроченные задачи пользователя"""
@@ -0,0 +1,180 @@
+"""
+Постраничный просмотр задач для /tasks.
+
+Страницы берутся из API по курсору по мере листания, следующая
+подгружается заранее в фоне (в кэш APIClient). Страница API рендерится
+блоками по задаче; если блоки не влезают в одно сообщение Telegram, страница
+делится на части по границам задач. Листание редактирует то же сообщение.
+
+В callback_data помещается только номер страницы и части (64 байта), сами
+курсоры лежат здесь, по списку на пользователя — память растёт только
+с числом пролистанных страниц.
+"""
+import asyncio
+import logging
+import re
+from collections import OrderedDict
+from datetime import datetime
+from html import escape
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from services.api_client import APIClient
+
+logger = logging.getLogger(__name__)
+
+# лимит текста сообщения Telegram — 4096, оставляем запас под заголовок и подвал
+MESSAGE_LIMIT = 3800
+DESCRIPTION_PREVIEW = 50
+TASK_FIELDS = 'title,description,created_at,due_date,completed,categories'
+
+
+class TaskPage(CallbackData, prefix='tasks'):
+    page: int
+    # часть страницы; -1 — последняя (листаем назад на предыдущую страницу)
+    part: int = 0
+
+
+def format_datetime(value: Optional[str]) -> Optional[str]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).strftime('%d.%m.%Y %H:%M')
+    except ValueError:
+        return value
+
+
+def render_task(number: int, task: dict) -> str:
+    """Блок одной задачи в HTML: пользовательский текст экранирован, теги закрыты внутри блока"""
+    status = "✅" if task.get('completed') else "⏳"
+    lines = [f"{number}. {status} <b>{escape(task['title'])}</b>"]
+    description = task.get('description')
+    if description:
+        if len(description) > DESCRIPTION_PREVIEW:
+            description = description[:DESCRIPTION_PREVIEW] + "..."
+        lines.append(f"   📝 {escape(description)}")
+    lines.append(f"   📅 Создано: {format_datetime(task.get('created_at'))}")
+    due_date = format_datetime(task.get('due_date'))
+    if due_date:
+        lines.append(f"   ⏰ Срок: {due_date}")
+    if task.get('categories'):
+        names = ', '.join(escape(category['name']) for category in task['categories'])
+        lines.append(f"   🏷️ Категории: {names}")
+    return '\n'.join(lines)
+
+
+def split_blocks(blocks: List[str], limit: int = MESSAGE_LIMIT) -> List[str]:
+    """Склеивает блоки в сообщения не длиннее limit, разрезая только между блоками"""
+    parts = []
+    current = []
+    size = 0
+    for block in blocks:
+        # блок длиннее лимита не влезет никуда — обрезаем хвост (категории; <b> только в первой строке),
+        # не оставляя половину HTML-сущности
+        if len(block) > limit:
+            block = re.sub(r'&[^;\s]*$', '', block[:limit - 1]) + '…'
+        if current and size + len(block) + 2 > limit:
+            parts.append('\n\n'.join(current))
+            current, size = [], 0
+        current.append(block)
+        size += len(block) + 2
+    if current:
+        parts.append('\n\n'.join(current))
+    return parts
+
+
+def cursor_from_link(link: Optional[str]) -> Optional[str]:
+    if not link:
+        return None
+    return parse_qs(urlsplit(link).query).get('cursor', [None])[0]
+
+
+class TaskBrowser:
+    def __init__(self, api: APIClient, page_size: int = 10, max_users: int = 10000):
+        self.api = api
+        self.page_size = page_size
+        self.max_users = max_users
+        # user_id -> курсоры страниц: [None (первая), курсор второй, ...]
+        self.cursors: 'OrderedDict[int, List[Optional[str]]]' = OrderedDict()
+        # фоновые загрузки страниц: не даём двум запросам за одной страницей идти параллельно
+        self.inflight: Dict[Tuple[int, Optional[str]], asyncio.Task] = {}
+
+    def start(self, user_id: int):
+        """Новый просмотр с первой страницы"""
+        self.cursors.pop(user_id, None)
+        self.cursors[user_id] = [None]
+        while len(self.cursors) > self.max_users:
+            self.cursors.popitem(last=False)
+
+    def load(self, user_id: int, cursor: Optional[str]) -> asyncio.Task:
+        """Загрузка страницы; пока она идёт, повторный вызов вернёт ту же задачу"""
+        key = (user_id, cursor)
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self.api.get_task_page(
+                user_id, cursor=cursor, page_size=self.page_size, fields=TASK_FIELDS, expand='categories'
+            ))
+            self.inflight[key] = task
+            task.add_done_callback(lambda done: self.on_loaded(key, done))
+        return task
+
+    def on_loaded(self, key: Tuple[int, Optional[str]], task: asyncio.Task):
+        self.inflight.pop(key, None)
+        # результат уже в кэше APIClient; здесь только забираем ошибку фоновой загрузки
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Не удалось загрузить страницу задач: {task.exception()}")
+
+    async def fetch(self, user_id: int, cursor: Optional[str]) -> Optional[dict]:
+        # shield: отмена одного обработчика не отменяет загрузку, которую ждёт другой
+        return await asyncio.shield(self.load(user_id, cursor))
+
+    async def render(self, user_id: int, page: int, part: int = 0) -> Optional[Tuple[str, InlineKeyboardMarkup]]:
+        """Текст и клавиатура части страницы; None — курсора нет (бот перезапускался или список сброшен)"""
+        cursors = self.cursors.get(user_id)
+        if cursors is None or page >= len(cursors):
+            return None
+        self.cursors.move_to_end(user_id)
+
+        data, stats = await asyncio.gather(self.fetch(user_id, cursors[page]), self.api.get_task_stats(user_id))
+        if data is None:
+            return "⚠️ Не удалось загрузить задачи. Попробуйте позже.", InlineKeyboardMarkup(inline_keyboard=[])
+        tasks = data.get('results', [])
+        if not tasks and page == 0:
+            return ("📭 У вас пока нет задач.\nИспользуйте /add чтобы создать первую.",
+                    InlineKeyboardMarkup(inline_keyboard=[]))
+
+        # курсоры дальше этой страницы могли устареть — берём свежий из ответа
+        next_cursor = cursor_from_link(data.get('next'))
+        del cursors[page + 1:]
+        if next_cursor is not None:
+            cursors.append(next_cursor)
+            # следующую страницу заранее, пока пользователь читает эту
+            self.load(user_id, next_cursor)
+
+        first = page * self.page_size + 1
+        parts = split_blocks([render_task(first + i, task) for i, task in enumerate(tasks)]) or ['']
+        part = part % len(parts)
+
+        text = f"📋 <b>Ваши задачи</b> — стр. {page + 1}"
+        if len(parts) > 1:
+            text += f" ({part + 1}/{len(parts)})"
+        text += f"\n\n{parts[part]}\n\n"
+        if stats:
+            text += (f"📊 <b>Всего задач: {stats['total']}</b>\n"
+                     f"✅ Выполнено: {stats['completed']} · ⏳ В работе: {stats['pending']}")
+            if stats['overdue']:
+                text += f" · 🔥 Просрочено: {stats['overdue']}"
+
+        buttons = []
+        if part > 0:
+            buttons.append(InlineKeyboardButton(text="◀️", callback_data=TaskPage(page=page, part=part - 1).pack()))
+        elif page > 0:
+            buttons.append(InlineKeyboardButton(text="◀️", callback_data=TaskPage(page=page - 1, part=-1).pack()))
+        if part + 1 < len(parts):
+            buttons.append(InlineKeyboardButton(text="▶️", callback_data=TaskPage(page=page, part=part + 1).pack()))
+        elif next_cursor is not None:
+            buttons.append(InlineKeyboardButton(text="▶️", callback_data=TaskPage(page=page + 1).pack()))
+        return text, InlineKeyboardMarkup(inline_keyboard=[buttons] if buttons else [])